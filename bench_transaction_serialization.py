@@ -0,0 +1,85 @@
+import argparse
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from pydantic import TypeAdapter
+
+import models
+import schemas
+from fast_json import FastJSONResponse
+from services.common import build_transaction_list_response, build_transaction_rows
+from services.read_models import TRANSACTION_COLUMNS
+
+TransactionRow = namedtuple(
+    "TransactionRow", [column.key for column in TRANSACTION_COLUMNS]
+)
+
+
+def synthetic_rows(count):
+    account_id = uuid.uuid4()
+    now = datetime.now(timezone.utc)
+    return [
+        TransactionRow(
+            transaction_id=uuid.uuid4(),
+            account_id=account_id,
+            date=now - timedelta(minutes=17 * index),
+            amount=Decimal("1250.75") + index,
+            currency="NPR",
+            type="DEBIT" if index % 3 else "CREDIT",
+            status="BOOKED",
+            description=f"Payment {index}",
+            merchant="Bhat-Bhateni Supermarket",
+            category="Groceries",
+        )
+        for index in range(count)
+    ]
+
+
+def encode_before(transactions, page_adapter):
+    # What the endpoint did: a pydantic model per row, then FastAPI validates
+    # the returned page against response_model and dumps it to JSON.
+    page = schemas.TransactionPage(
+        transactions=build_transaction_list_response(transactions), next_cursor=None
+    )
+    return page_adapter.dump_json(page_adapter.validate_python(page))
+
+
+def encode_after(rows):
+    return FastJSONResponse(
+        {"transactions": build_transaction_rows(rows), "next_cursor": None}
+    ).body
+
+
+def per_row_microseconds(encode, page_size, repeats):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        encode()
+    return (time.perf_counter() - started) * 1_000_000 / (page_size * repeats)
+
+
+def run_benchmark(page_size, repeats):
+    rows = synthetic_rows(page_size)
+    transactions = [models.Transaction(**row._asdict()) for row in rows]
+    page_adapter = TypeAdapter(schemas.TransactionPage)
+
+    before = per_row_microseconds(
+        lambda: encode_before(transactions, page_adapter), page_size, repeats
+    )
+    after = per_row_microseconds(lambda: encode_after(rows), page_size, repeats)
+    print(f"page size {page_size}, {repeats} pages each")
+    print(f"pydantic build + response_model validation: {before:.2f} us/row")
+    print(f"database tuples + orjson:                   {after:.2f} us/row")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare per-row serialization cost of transaction list pages."
+    )
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+    run_benchmark(args.page_size, args.repeats)
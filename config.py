@@ -14,3 +14,118 @@ APP_ENV = os.getenv("APP_ENV", "development").lower()
 # Key management settings for sandbox envelope encryption.
 MASTER_KEY_B64 = os.getenv("MASTER_KEY_B64")
 STRICT_KEY_MANAGEMENT = os.getenv("STRICT_KEY_MANAGEMENT", "false").lower() == "true"
+
+# Decoded access-token claims are cached until the token's own expiry.
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+# Authenticated principals (user row + accounts) are cached briefly so protected
+# endpoints can authorize without a users lookup on every request.
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+
+# bcrypt work runs on a dedicated pool so logins cannot stall the event loop.
+# Requests beyond workers + queue limit are rejected with 503 instead of piling up.
+PASSWORD_HASH_MAX_WORKERS = int(
+    os.getenv("PASSWORD_HASH_MAX_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
+# Replay protection for signed requests: the signature covers X-Request-Timestamp,
+# requests more than MAX_SKEW seconds away from server time are rejected, and
+# each X-Request-ID is accepted once within the window. The nonce TTL must cover
+# the whole window (2 x MAX_SKEW), so IDs only need to be kept for minutes.
+# "memory" is per-process; use "postgres" when running several workers.
+# The memory store never evicts live IDs: once MAX_ENTRIES are live within the
+# TTL it rejects signed requests with 503 rather than forget one. The defaults
+# allow about 330 signed writes per second per process.
+SIGNED_REQUEST_MAX_SKEW_SECONDS = int(
+    os.getenv("SIGNED_REQUEST_MAX_SKEW_SECONDS", "300")
+)
+SIGNED_REQUEST_NONCE_BACKEND = os.getenv(
+    "SIGNED_REQUEST_NONCE_BACKEND", "memory"
+).lower()
+SIGNED_REQUEST_NONCE_TTL_SECONDS = int(
+    os.getenv(
+        "SIGNED_REQUEST_NONCE_TTL_SECONDS", str(2 * SIGNED_REQUEST_MAX_SKEW_SECONDS)
+    )
+)
+SIGNED_REQUEST_NONCE_MAX_ENTRIES = int(
+    os.getenv("SIGNED_REQUEST_NONCE_MAX_ENTRIES", "200000")
+)
+SIGNED_REQUEST_NONCE_SWEEP_SECONDS = int(
+    os.getenv("SIGNED_REQUEST_NONCE_SWEEP_SECONDS", "60")
+)
+
+# Envelope encryption data keys: a wrapped DEK is reused for up to N encryptions
+# per AAD context within its lifetime, and unwrapped DEKs are memoized for reads.
+DEK_REUSE_MAX_ENCRYPTIONS = int(os.getenv("DEK_REUSE_MAX_ENCRYPTIONS", "1000"))
+DEK_CACHE_TTL_SECONDS = float(os.getenv("DEK_CACHE_TTL_SECONDS", "300"))
+DEK_CACHE_MAX_ENTRIES = int(os.getenv("DEK_CACHE_MAX_ENTRIES", "10000"))
+
+# Decrypted PII (phone, email, account number) read cache. Entries are tied to the
+# ciphertext they came from, so re-encrypted or updated rows miss automatically.
+PII_CACHE_MAX_ENTRIES = int(os.getenv("PII_CACHE_MAX_ENTRIES", "5000"))
+PII_CACHE_TTL_SECONDS = float(os.getenv("PII_CACHE_TTL_SECONDS", "300"))
+
+# Connection pooling. Request handlers are async, so the async engine's pool is
+# sized on its own: one connection per in-flight request, plus a small overflow
+# for bursts. The sync engine only serves startup work (run via asyncio.to_thread)
+# and standalone scripts, so it gets a small fixed pool.
+# THREADPOOL_MAX_WORKERS sizes anyio's threadpool, which runs sync route
+# dependencies; it does not bound the connection pools.
+THREADPOOL_MAX_WORKERS = int(os.getenv("THREADPOOL_MAX_WORKERS", "40"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+SYNC_DB_POOL_SIZE = int(os.getenv("SYNC_DB_POOL_SIZE", "2"))
+SYNC_DB_MAX_OVERFLOW = int(os.getenv("SYNC_DB_MAX_OVERFLOW", "2"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Startup readiness probe (database.wait_for_database).
+DB_CONNECT_ATTEMPTS = int(os.getenv("DB_CONNECT_ATTEMPTS", "10"))
+DB_CONNECT_RETRY_SECONDS = float(os.getenv("DB_CONNECT_RETRY_SECONDS", "3"))
+
+# Startup leader election: one worker runs migrations and seeding while the others
+# poll the advisory lock and then check the readiness marker.
+STARTUP_LOCK_POLL_SECONDS = float(os.getenv("STARTUP_LOCK_POLL_SECONDS", "1"))
+STARTUP_LEADER_WAIT_SECONDS = float(os.getenv("STARTUP_LEADER_WAIT_SECONDS", "600"))
+
+# Demo stock holdings: "startup" seeds inside the startup leader before serving,
+# "background" seeds from the startup leader after the app is up, "off" leaves it
+# to seed_stocks.py.
+STOCK_SEED_MODE = os.getenv("STOCK_SEED_MODE", "background").lower()
+
+# Optional read replicas (comma-separated URLs, same format as DATABASE_URL).
+# Read-only GET dependencies are routed to a replica whose measured lag is within
+# REPLICA_MAX_LAG_SECONDS and fall back to the primary otherwise.
+DATABASE_REPLICA_URLS = [
+    url.strip()
+    for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+    if url.strip()
+]
+REPLICA_SELECTION = os.getenv("REPLICA_SELECTION", "round_robin").lower()
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+
+# Monthly RANGE (date) partitioning of transactions. Applies to newly created
+# tables; partitions are kept TRANSACTION_PARTITION_MONTHS_AHEAD months ahead.
+TRANSACTIONS_PARTITIONED = (
+    os.getenv("TRANSACTIONS_PARTITIONED", "false").lower() == "true"
+)
+TRANSACTION_PARTITION_MONTHS_AHEAD = int(
+    os.getenv("TRANSACTION_PARTITION_MONTHS_AHEAD", "3")
+)
+
+# Idempotency records are honoured for IDEMPOTENCY_TTL_SECONDS; after that the key
+# may be reused and the row is removed by the background sweeper.
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_SWEEP_SECONDS = float(os.getenv("IDEMPOTENCY_SWEEP_SECONDS", "300"))
+IDEMPOTENCY_SWEEP_BATCH_SIZE = int(os.getenv("IDEMPOTENCY_SWEEP_BATCH_SIZE", "1000"))
+# A reservation that never completed (worker crash mid-request) blocks its key for
+# at most this long. Completed responses are also kept in a per-process front cache.
+IDEMPOTENCY_PENDING_TIMEOUT_SECONDS = int(
+    os.getenv("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", "60")
+)
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_CACHE_MAX_ENTRIES", "10000"))
+IDEMPOTENCY_CACHE_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_CACHE_TTL_SECONDS", "300"))
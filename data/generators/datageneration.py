@@ -1,3 +1,4 @@
+import hashlib
 import random
 from datetime import datetime, timedelta
 import uuid
@@ -591,7 +592,30 @@ def write_transaction(
     return 1  # Return 1 to count the transaction
 
 
-def generate_sql_for_persona(persona_name, definitions, start_date, end_date):
+def transactions_table_ddl(start_date, end_date):
+    """
+    Partitioned transactions DDL matching TRANSACTIONS_PARTITIONED=true in the API:
+    monthly RANGE (date) partitions covering the generated period plus a default.
+    """
+    ddl = (
+        "CREATE TABLE IF NOT EXISTS transactions (\n    transaction_id UUID NOT NULL,\n    account_id UUID NOT NULL REFERENCES accounts(account_id) ON DELETE CASCADE,\n    date TIMESTAMPTZ NOT NULL,\n    amount NUMERIC(10,2) NOT NULL,\n    currency VARCHAR(3) NOT NULL,\n    type VARCHAR(10) NOT NULL,\n    status VARCHAR(15) NOT NULL,\n    category_purpose_code VARCHAR(4) NOT NULL DEFAULT 'OTHR',\n    mcc INTEGER NOT NULL DEFAULT 5999,\n    proprietary_bank_code VARCHAR(20) NOT NULL DEFAULT 'GIBL-FT-01',\n    description VARCHAR,\n    merchant VARCHAR,\n    merchant_logo_url VARCHAR,\n    merchant_verified_status BOOLEAN NOT NULL DEFAULT false,\n    category VARCHAR,\n    PRIMARY KEY (transaction_id, date)\n) PARTITION BY RANGE (date);\n\n"
+    )
+    month = datetime(start_date.year, start_date.month, 1)
+    while month <= end_date:
+        next_month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+        ddl += (
+            f"CREATE TABLE IF NOT EXISTS transactions_y{month:%Y}m{month:%m} PARTITION OF transactions "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{next_month:%Y-%m-%d} 00:00:00+00');\n"
+        )
+        month = next_month
+    ddl += "CREATE TABLE IF NOT EXISTS transactions_default PARTITION OF transactions DEFAULT;\n"
+    ddl += "CREATE INDEX IF NOT EXISTS ix_transactions_account_id_date ON transactions (account_id, date DESC) INCLUDE (transaction_id, amount, currency, type, status, description, merchant, category);\n\n"
+    return ddl
+
+
+def generate_sql_for_persona(
+    persona_name, definitions, start_date, end_date, partition_transactions=False
+):
     """
     Main generation function.
     """
@@ -635,7 +659,9 @@ def generate_sql_for_persona(persona_name, definitions, start_date, end_date):
         "CREATE TABLE IF NOT EXISTS accounts (\n    account_id UUID PRIMARY KEY,\n    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,\n    bank_name VARCHAR NOT NULL,\n    account_number_masked VARCHAR NOT NULL,\n    account_number_encrypted VARCHAR,\n    account_number_hash VARCHAR(64),\n    account_type VARCHAR NOT NULL,\n    balance NUMERIC(12,2) NOT NULL\n);\n\n"
     )
     f.write(
-        "CREATE TABLE IF NOT EXISTS transactions (\n    transaction_id UUID PRIMARY KEY,\n    account_id UUID NOT NULL REFERENCES accounts(account_id) ON DELETE CASCADE,\n    date TIMESTAMPTZ NOT NULL,\n    amount NUMERIC(10,2) NOT NULL,\n    currency VARCHAR(3) NOT NULL,\n    type VARCHAR(10) NOT NULL,\n    status VARCHAR(15) NOT NULL,\n    category_purpose_code VARCHAR(4) NOT NULL DEFAULT 'OTHR',\n    mcc INTEGER NOT NULL DEFAULT 5999,\n    proprietary_bank_code VARCHAR(20) NOT NULL DEFAULT 'GIBL-FT-01',\n    description VARCHAR,\n    merchant VARCHAR,\n    merchant_logo_url VARCHAR,\n    merchant_verified_status BOOLEAN NOT NULL DEFAULT false,\n    category VARCHAR\n);\n\n"
+        transactions_table_ddl(start_date, end_date)
+        if partition_transactions
+        else "CREATE TABLE IF NOT EXISTS transactions (\n    transaction_id UUID PRIMARY KEY,\n    account_id UUID NOT NULL REFERENCES accounts(account_id) ON DELETE CASCADE,\n    date TIMESTAMPTZ NOT NULL,\n    amount NUMERIC(10,2) NOT NULL,\n    currency VARCHAR(3) NOT NULL,\n    type VARCHAR(10) NOT NULL,\n    status VARCHAR(15) NOT NULL,\n    category_purpose_code VARCHAR(4) NOT NULL DEFAULT 'OTHR',\n    mcc INTEGER NOT NULL DEFAULT 5999,\n    proprietary_bank_code VARCHAR(20) NOT NULL DEFAULT 'GIBL-FT-01',\n    description VARCHAR,\n    merchant VARCHAR,\n    merchant_logo_url VARCHAR,\n    merchant_verified_status BOOLEAN NOT NULL DEFAULT false,\n    category VARCHAR\n);\n\n"
     )
     f.write(
         "CREATE TABLE IF NOT EXISTS stock_instruments (\n    id UUID PRIMARY KEY,\n    user_id VARCHAR(64) NOT NULL,\n    symbol VARCHAR(20) NOT NULL,\n    name VARCHAR(255),\n    quantity NUMERIC(18,6) NOT NULL DEFAULT 0,\n    average_buy_price NUMERIC(18,6),\n    current_price NUMERIC(18,6),\n    currency VARCHAR(10),\n    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),\n    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),\n    CONSTRAINT uq_stock_instruments_user_id_id UNIQUE (user_id, id),\n    CONSTRAINT uq_stock_instruments_user_id_symbol UNIQUE (user_id, symbol)\n);\n\n"
@@ -663,13 +689,17 @@ def generate_sql_for_persona(persona_name, definitions, start_date, end_date):
 
     phone_number_seed = int(uuid.UUID(user["id"]).int % 100000000)
     phonenumber = user.get("phonenumber") or f"98{phone_number_seed:08d}"
+    # Same digest as encryption_service.stable_hash, which phone lookups probe.
+    phonenumber_hash = hashlib.sha256(
+        phonenumber.strip().lower().encode("utf-8")
+    ).hexdigest()
     hashed_password = user.get(
         "hashed_password",
         "$2b$12$PsoHAtQzRQeGTzRGFj06ge64vKnjHRcIzmkJgTY3VouoMVTRO5Pyy",
     )
 
     f.write(
-        f"INSERT INTO users (user_id, username, phonenumber, phonenumber_encrypted, phonenumber_hash, email_encrypted, email_hash, full_name, role, hashed_password, created_at) VALUES ('{user['id']}', '{username}', '{phonenumber}', NULL, NULL, NULL, NULL, '{user['name']}', 'customer', '{hashed_password}', '{start_timestamp_str}') ON CONFLICT (user_id) DO NOTHING;\n"
+        f"INSERT INTO users (user_id, username, phonenumber, phonenumber_encrypted, phonenumber_hash, email_encrypted, email_hash, full_name, role, hashed_password, created_at) VALUES ('{user['id']}', '{username}', '{phonenumber}', NULL, '{phonenumber_hash}', NULL, NULL, '{user['name']}', 'customer', '{hashed_password}', '{start_timestamp_str}') ON CONFLICT (user_id) DO NOTHING;\n"
     )
     # -----------------------------
 
@@ -819,6 +849,11 @@ if __name__ == "__main__":
         default=42,
         help="Base random seed for deterministic generation.",
     )
+    parser.add_argument(
+        "--partition-transactions",
+        action="store_true",
+        help="Emit a monthly range-partitioned transactions table (TRANSACTIONS_PARTITIONED=true).",
+    )
     args = parser.parse_args()
 
     if "all" in args.personas:
@@ -840,4 +875,5 @@ if __name__ == "__main__":
                 PERSONA_DEFINITIONS,
                 start_date,
                 end_date,
+                partition_transactions=args.partition_transactions,
             )
@@ -76,7 +76,7 @@ CREATE INDEX IF NOT EXISTS ix_users_phonenumber_hash ON users (phonenumber_hash)
 CREATE INDEX IF NOT EXISTS ix_stock_instruments_user_id ON stock_instruments (user_id);
 
 -- 2) Insert persona (user + account)
-INSERT INTO users (user_id, username, phonenumber, phonenumber_encrypted, phonenumber_hash, email_encrypted, email_hash, full_name, role, hashed_password, created_at) VALUES ('a1b2c3d4-e5f6-7788-9900-aabbccddeeff', 'bikesh.maharjan', '9862606079', NULL, NULL, NULL, NULL, 'Bikesh Maharjan', 'customer', '$2b$12$o9rF2IB.MHIqRAlwTuqcUeX3F9PUz/8Vs8a7mPRZRDlS1xV9QsqIS', '2024-01-01T10:00:00Z') ON CONFLICT (user_id) DO NOTHING;
+INSERT INTO users (user_id, username, phonenumber, phonenumber_encrypted, phonenumber_hash, email_encrypted, email_hash, full_name, role, hashed_password, created_at) VALUES ('a1b2c3d4-e5f6-7788-9900-aabbccddeeff', 'bikesh.maharjan', '9862606079', NULL, '4496727bb28c33cbb50b8c84bab2331b247db50d636347b12d5f01fd835af264', NULL, NULL, 'Bikesh Maharjan', 'customer', '$2b$12$o9rF2IB.MHIqRAlwTuqcUeX3F9PUz/8Vs8a7mPRZRDlS1xV9QsqIS', '2024-01-01T10:00:00Z') ON CONFLICT (user_id) DO NOTHING;
 INSERT INTO accounts (user_id, account_id, bank_name, account_number_masked, account_number_encrypted, account_number_hash, account_type, balance) VALUES ('a1b2c3d4-e5f6-7788-9900-aabbccddeeff', 'b2a1c3d4-e5f6-7788-9900-aabbccddeeff', 'Nabil Bank', '**** 1234', NULL, NULL, 'Student Savings (Allowance)', 15000.00) ON CONFLICT (account_id) DO NOTHING;
 INSERT INTO accounts (user_id, account_id, bank_name, account_number_masked, account_number_encrypted, account_number_hash, account_type, balance) VALUES ('a1b2c3d4-e5f6-7788-9900-aabbccddeeff', 'c3d4e5f6-a1b2-7788-9900-aabbccddeeff', 'eSewa Bank', '**** 5678', NULL, NULL, 'Freelancer (Gig Money)', 10000.00) ON CONFLICT (account_id) DO NOTHING;
 
@@ -1,63 +1,157 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import Engine, create_engine, make_url, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
-from sqlalchemy.exc import OperationalError
-import os, time
+from sqlalchemy.exc import DBAPIError
+from functools import lru_cache
+import asyncio, os
+
+from config import (
+    DB_CONNECT_ATTEMPTS,
+    DB_CONNECT_RETRY_SECONDS,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE_SECONDS,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT_SECONDS,
+    SYNC_DB_MAX_OVERFLOW,
+    SYNC_DB_POOL_SIZE,
+)
+from pool_telemetry import InstrumentedAsyncQueuePool, InstrumentedQueuePool
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 connect_args = {}  # Define connect_args as an empty dictionary
 
-# Retry if DB not ready yet
-for i in range(10):
-    try:
-        engine = create_engine(DATABASE_URL, connect_args=connect_args)
-        with engine.connect() as conn:
+ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def build_async_database_url(url: str) -> str:
+    # The API runs on asyncpg while scripts keep psycopg2, so derive one URL
+    # from the other. asyncpg has no sslmode/channel_binding query arguments.
+    parsed = make_url(url)
+    parsed = parsed.set(
+        drivername=ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    )
+    if parsed.drivername == "postgresql+asyncpg":
+        sslmode = parsed.query.get("sslmode")
+        parsed = parsed.difference_update_query(["sslmode", "channel_binding"])
+        if sslmode and sslmode != "disable":
+            parsed = parsed.update_query_dict({"ssl": sslmode})
+    return parsed.render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or build_async_database_url(
+    DATABASE_URL
+)
+
+
+def pool_options(
+    url: str,
+    poolclass,
+    pool_size: int = DB_POOL_SIZE,
+    max_overflow: int = DB_MAX_OVERFLOW,
+) -> dict:
+    # SQLite (local experiments only) manages its own pool; sizing knobs apply
+    # to server databases.
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+@lru_cache(maxsize=None)
+def get_engine() -> Engine:
+    # create_engine does not connect; the first checkout does. Nothing touches
+    # the network at import time.
+    return create_engine(
+        DATABASE_URL,
+        connect_args=connect_args,
+        **pool_options(
+            DATABASE_URL,
+            InstrumentedQueuePool,
+            pool_size=SYNC_DB_POOL_SIZE,
+            max_overflow=SYNC_DB_MAX_OVERFLOW,
+        ),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_async_engine() -> AsyncEngine:
+    # Request handlers use the async stack; the sync engine stays for startup
+    # DDL and standalone scripts such as migrate_encrypt_legacy_data.py.
+    return create_async_engine(
+        ASYNC_DATABASE_URL,
+        **pool_options(ASYNC_DATABASE_URL, InstrumentedAsyncQueuePool),
+    )
+
+
+class _LazyBindMixin:
+    # Binds the factory to its engine on first use instead of at import.
+    def __init__(self, engine_getter, **kw):
+        super().__init__(**kw)
+        self._engine_getter = engine_getter
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=self._engine_getter())
+        return super().__call__(**local_kw)
+
+
+class LazySessionmaker(_LazyBindMixin, sessionmaker):
+    pass
+
+
+class LazyAsyncSessionmaker(_LazyBindMixin, async_sessionmaker):
+    pass
+
+
+SessionLocal = LazySessionmaker(get_engine, autocommit=False, autoflush=False)
+AsyncSessionLocal = LazyAsyncSessionmaker(
+    get_async_engine, autoflush=False, expire_on_commit=False
+)
+
+
+async def wait_for_database(
+    attempts: int = DB_CONNECT_ATTEMPTS, delay: float = DB_CONNECT_RETRY_SECONDS
+):
+    # Readiness probe for startup; sleeps without blocking the event loop so
+    # the worker can come up while Postgres is still starting.
+    for attempt in range(1, attempts + 1):
+        try:
+            async with get_async_engine().connect() as conn:
+                await conn.execute(text("SELECT 1"))
             print("Database connection established.")
-        break
-    except OperationalError as e:
-        print(f"Waiting for database... ({i+1}/10) {e}")
-        time.sleep(3)
-else:
-    raise RuntimeError("Could not connect to the database after 10 attempts.")
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            return
+        except (DBAPIError, OSError) as e:
+            print(f"Waiting for database... ({attempt}/{attempts}) {e}")
+            if attempt < attempts:
+                await asyncio.sleep(delay)
+    raise RuntimeError(f"Could not connect to the database after {attempts} attempts.")
+
+
 Base = declarative_base()
 
 
 def create_tables():
-    Base.metadata.create_all(bind=engine)
-
-
-def run_bootstrap_migrations():
-    # create_all creates missing tables, but does not alter existing ones.
-    # This lightweight bootstrap patch keeps deployed sandbox databases compatible.
-    statements = [
-        "ALTER TABLE users ADD COLUMN IF NOT EXISTS phonenumber_encrypted VARCHAR",
-        "ALTER TABLE users ADD COLUMN IF NOT EXISTS phonenumber_hash VARCHAR(64)",
-        "ALTER TABLE users ADD COLUMN IF NOT EXISTS email_encrypted VARCHAR",
-        "ALTER TABLE users ADD COLUMN IF NOT EXISTS email_hash VARCHAR(64)",
-        "ALTER TABLE users ADD COLUMN IF NOT EXISTS role VARCHAR(30) NOT NULL DEFAULT 'customer'",
-        "ALTER TABLE users ALTER COLUMN phonenumber DROP NOT NULL",
-        "ALTER TABLE accounts ADD COLUMN IF NOT EXISTS account_number_encrypted VARCHAR",
-        "ALTER TABLE accounts ADD COLUMN IF NOT EXISTS account_number_hash VARCHAR(64)",
-        "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS category_purpose_code VARCHAR(4) NOT NULL DEFAULT 'OTHR'",
-        "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS mcc INTEGER NOT NULL DEFAULT 5999",
-        "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS proprietary_bank_code VARCHAR(20) NOT NULL DEFAULT 'GIBL-FT-01'",
-        "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS merchant_logo_url VARCHAR",
-        "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS merchant_verified_status BOOLEAN NOT NULL DEFAULT false",
-        "CREATE TABLE IF NOT EXISTS idempotency_records (id UUID PRIMARY KEY, idempotency_key VARCHAR(128) NOT NULL UNIQUE, endpoint VARCHAR(128) NOT NULL, request_hash VARCHAR(64) NOT NULL, response_status_code INTEGER NOT NULL, response_body VARCHAR NOT NULL, created_at TIMESTAMPTZ NOT NULL DEFAULT NOW())",
-        "CREATE INDEX IF NOT EXISTS ix_users_phonenumber_hash ON users (phonenumber_hash)",
-        "CREATE UNIQUE INDEX IF NOT EXISTS uq_users_email_hash ON users (email_hash)",
-        "CREATE UNIQUE INDEX IF NOT EXISTS uq_accounts_account_number_hash ON accounts (account_number_hash)",
-        "CREATE INDEX IF NOT EXISTS ix_idempotency_records_idempotency_key ON idempotency_records (idempotency_key)",
-    ]
-
-    with engine.begin() as conn:
-        for statement in statements:
-            conn.execute(text(statement))
+    Base.metadata.create_all(bind=get_engine())
 
 
 def get_db():
@@ -66,3 +160,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -2,11 +2,20 @@ import base64
 import hashlib
 import json
 import os
-from typing import Any, Dict, Optional
+import threading
+from typing import Any, Dict, Optional, Tuple
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
-from config import MASTER_KEY_B64, SECRET_KEY, STRICT_KEY_MANAGEMENT
+from config import (
+    DEK_CACHE_MAX_ENTRIES,
+    DEK_CACHE_TTL_SECONDS,
+    DEK_REUSE_MAX_ENCRYPTIONS,
+    MASTER_KEY_B64,
+    SECRET_KEY,
+    STRICT_KEY_MANAGEMENT,
+)
+from ttl_cache import TTLCache
 
 
 def _b64e(data: bytes) -> str:
@@ -37,9 +46,20 @@ class SandboxKMS:
     def __init__(self, master_key: Optional[bytes] = None):
         self._master_key = master_key or _load_master_key()
 
-    def wrap_key(self, dek: bytes, context: bytes = b"sandbox") -> Dict[str, str]:
+    def wrap_key_raw(
+        self, dek: bytes, context: bytes = b"sandbox"
+    ) -> Tuple[bytes, bytes]:
         key_iv = os.urandom(12)
         wrapped = AESGCM(self._master_key).encrypt(key_iv, dek, context)
+        return key_iv, wrapped
+
+    def unwrap_key_raw(
+        self, key_iv: bytes, wrapped: bytes, context: bytes = b"sandbox"
+    ) -> bytes:
+        return AESGCM(self._master_key).decrypt(key_iv, wrapped, context)
+
+    def wrap_key(self, dek: bytes, context: bytes = b"sandbox") -> Dict[str, str]:
+        key_iv, wrapped = self.wrap_key_raw(dek, context)
         return {
             "iv": _b64e(key_iv),
             "ciphertext": _b64e(wrapped),
@@ -48,36 +68,106 @@ class SandboxKMS:
     def unwrap_key(self, payload: Dict[str, str], context: bytes = b"sandbox") -> bytes:
         key_iv = _b64d(payload["iv"])
         wrapped = _b64d(payload["ciphertext"])
-        return AESGCM(self._master_key).decrypt(key_iv, wrapped, context)
+        return self.unwrap_key_raw(key_iv, wrapped, context)
 
 
 kms = SandboxKMS()
 
-
-def encrypt(data: str, *, aad: str = "sandbox", version: int = 1) -> str:
+# Compact v2 envelope: prefix + unpadded urlsafe base64 of
+# iv (12) | wrapped dek iv (12) | wrapped dek (32 + 16 tag) | ciphertext.
+# v1 envelopes are sorted-key JSON and always start with "{".
+ENVELOPE_V2_PREFIX = "kc2:"
+_IV_SIZE = 12
+_WRAPPED_DEK_SIZE = 48
+_V2_HEADER_SIZE = _IV_SIZE + _IV_SIZE + _WRAPPED_DEK_SIZE
+_V1_REQUIRED_KEYS = {"v", "alg", "iv", "ciphertext", "dek"}
+
+# aad -> [dek, (wrapped iv, wrapped dek), encryptions_done]. Every encryption
+# still draws a fresh random IV; the usage cap keeps each DEK far below GCM's
+# IV budget.
+_encryption_data_keys = TTLCache(
+    max_entries=DEK_CACHE_MAX_ENTRIES, default_ttl=DEK_CACHE_TTL_SECONDS
+)
+_encryption_data_keys_lock = threading.Lock()
+# (aad, wrapped iv, wrapped dek) -> unwrapped dek
+_unwrapped_data_keys = TTLCache(
+    max_entries=DEK_CACHE_MAX_ENTRIES, default_ttl=DEK_CACHE_TTL_SECONDS
+)
+
+
+def _data_key_for_encryption(aad: str) -> Tuple[bytes, Tuple[bytes, bytes]]:
+    with _encryption_data_keys_lock:
+        entry = _encryption_data_keys.get(aad)
+        if entry is None or entry[2] >= DEK_REUSE_MAX_ENCRYPTIONS:
+            dek = os.urandom(32)
+            entry = [dek, kms.wrap_key_raw(dek, context=aad.encode("utf-8")), 0]
+            _encryption_data_keys.set(aad, entry)
+        entry[2] += 1
+        return entry[0], entry[1]
+
+
+def _unwrap_data_key(key_iv: bytes, wrapped: bytes, aad: str) -> bytes:
+    cache_key = (aad, key_iv, wrapped)
+    dek = _unwrapped_data_keys.get(cache_key)
+    if dek is None:
+        dek = kms.unwrap_key_raw(key_iv, wrapped, context=aad.encode("utf-8"))
+        _unwrapped_data_keys.set(cache_key, dek)
+    return dek
+
+
+def clear_data_key_caches() -> None:
+    _encryption_data_keys.clear()
+    _unwrapped_data_keys.clear()
+
+
+def encrypt(data: str, *, aad: str = "sandbox", version: int = 2) -> str:
     if data is None:
         raise ValueError("encrypt(data) requires non-null input")
+    if version not in (1, 2):
+        raise ValueError(f"Unsupported envelope version: {version}")
 
-    dek = os.urandom(32)
-    iv = os.urandom(12)
+    dek, (key_iv, wrapped_dek) = _data_key_for_encryption(aad)
+    iv = os.urandom(_IV_SIZE)
     ciphertext = AESGCM(dek).encrypt(iv, data.encode("utf-8"), aad.encode("utf-8"))
-    wrapped_dek = kms.wrap_key(dek, context=aad.encode("utf-8"))
+
+    if version == 2:
+        packed = base64.urlsafe_b64encode(iv + key_iv + wrapped_dek + ciphertext)
+        return ENVELOPE_V2_PREFIX + packed.rstrip(b"=").decode("ascii")
 
     envelope = {
         "v": version,
         "alg": "AES-256-GCM",
         "iv": _b64e(iv),
         "ciphertext": _b64e(ciphertext),
-        "dek": wrapped_dek,
+        "dek": {"iv": _b64e(key_iv), "ciphertext": _b64e(wrapped_dek)},
     }
     return json.dumps(envelope, separators=(",", ":"), sort_keys=True)
 
 
+def _unpack_v2(payload: str) -> Tuple[bytes, bytes, bytes, bytes]:
+    body = payload[len(ENVELOPE_V2_PREFIX) :]
+    raw = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+    if len(raw) <= _V2_HEADER_SIZE:
+        raise ValueError("Truncated v2 envelope")
+    return (
+        raw[:_IV_SIZE],
+        raw[_IV_SIZE : 2 * _IV_SIZE],
+        raw[2 * _IV_SIZE : _V2_HEADER_SIZE],
+        raw[_V2_HEADER_SIZE:],
+    )
+
+
 def decrypt(payload: str, *, aad: str = "sandbox") -> str:
-    envelope = json.loads(payload)
-    dek = kms.unwrap_key(envelope["dek"], context=aad.encode("utf-8"))
-    iv = _b64d(envelope["iv"])
-    ciphertext = _b64d(envelope["ciphertext"])
+    if payload.startswith(ENVELOPE_V2_PREFIX):
+        iv, key_iv, wrapped_dek, ciphertext = _unpack_v2(payload)
+    else:
+        envelope = json.loads(payload)
+        iv = _b64d(envelope["iv"])
+        ciphertext = _b64d(envelope["ciphertext"])
+        key_iv = _b64d(envelope["dek"]["iv"])
+        wrapped_dek = _b64d(envelope["dek"]["ciphertext"])
+
+    dek = _unwrap_data_key(key_iv, wrapped_dek, aad)
     plaintext = AESGCM(dek).decrypt(iv, ciphertext, aad.encode("utf-8"))
     return plaintext.decode("utf-8")
 
@@ -85,12 +175,17 @@ def decrypt(payload: str, *, aad: str = "sandbox") -> str:
 def looks_encrypted(value: Optional[str]) -> bool:
     if not value or not isinstance(value, str):
         return False
+    if value.startswith(ENVELOPE_V2_PREFIX):
+        return True
+    # Only values shaped like a JSON object can be v1 envelopes; skip parsing
+    # for everything else (plaintext legacy values).
+    if not value.startswith("{"):
+        return False
     try:
         obj = json.loads(value)
     except Exception:
         return False
-    required = {"v", "alg", "iv", "ciphertext", "dek"}
-    return isinstance(obj, dict) and required.issubset(set(obj.keys()))
+    return isinstance(obj, dict) and _V1_REQUIRED_KEYS.issubset(obj.keys())
 
 
 def safe_decrypt(value: Optional[str], *, aad: str = "sandbox") -> Optional[str]:
@@ -1,76 +1,139 @@
+from datetime import datetime, timezone
+from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Security
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Security
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
-import models
+from fast_json import FastJSONResponse, dumps
+from read_replicas import get_read_db, read_session
 import schemas
-from security import get_current_user
+from security import AuthenticatedPrincipal, ensure_owned, get_current_user
 from services.common import (
-    build_transaction_list_response,
-    get_masked_account_number,
-    get_visible_transactions_query,
+    build_transaction_row,
+    build_transaction_rows,
+    get_or_persist_masked_account_number,
+)
+from services.read_models import (
+    fetch_owned_transaction_page,
+    get_owned_account_row,
+    select_account_history_rows,
 )
 
 router = APIRouter(tags=["Accounts"])
 
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 500
+EXPORT_BATCH_SIZE = 500
 
-@router.get("/accounts/{account_id}", response_model=schemas.AccountWithTransactions)
-def get_account(
-    account_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: models.User = Security(get_current_user, scopes=["account:read"]),
+
+async def _get_transaction_page(
+    db: AsyncSession, account_id, user_id, cursor, limit, forbidden: str
 ):
-    db_account = (
-        db.query(models.Account).filter(models.Account.account_id == account_id).first()
-    )
-    if db_account is None:
-        raise HTTPException(status_code=404, detail="Account not found")
-    if db_account.user_id != current_user.user_id:
-        raise HTTPException(
-            status_code=403, detail="Not authorized to access this account"
+    try:
+        account, transactions, next_cursor = await fetch_owned_transaction_page(
+            db, account_id, user_id, cursor, limit
         )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    ensure_owned(account, not_found="Account not found", forbidden=forbidden)
+    return account, transactions, next_cursor
 
-    visible_transactions = (
-        get_visible_transactions_query(db)
-        .filter(models.Transaction.account_id == db_account.account_id)
-        .order_by(models.Transaction.date.desc())
-        .all()
+
+@router.get("/accounts/{account_id}", response_model=schemas.AccountWithTransactions)
+async def get_account(
+    account_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: AuthenticatedPrincipal = Security(
+        get_current_user, scopes=["account:read"]
+    ),
+):
+    db_account, visible_transactions, next_cursor = await _get_transaction_page(
+        db,
+        account_id,
+        current_user.user_id,
+        cursor,
+        limit,
+        forbidden="Not authorized to access this account",
     )
 
-    return schemas.AccountWithTransactions(
-        account_id=db_account.account_id,
-        user_id=db_account.user_id,
-        bank_name=db_account.bank_name,
-        account_number_masked=get_masked_account_number(db_account),
-        account_type=db_account.account_type,
-        balance=float(db_account.balance),
-        transactions=build_transaction_list_response(visible_transactions),
+    # response_model documents the shape; the rows are returned pre-encoded so
+    # a full page is not re-validated item by item.
+    return FastJSONResponse(
+        {
+            "user_id": db_account.user_id,
+            "bank_name": db_account.bank_name,
+            "account_number_masked": await get_or_persist_masked_account_number(
+                db_account
+            ),
+            "account_type": db_account.account_type,
+            "balance": float(db_account.balance),
+            "account_id": db_account.account_id,
+            "transactions": build_transaction_rows(visible_transactions),
+            "next_cursor": next_cursor,
+        }
     )
 
 
 @router.get(
-    "/accounts/{account_id}/transactions", response_model=list[schemas.Transaction]
+    "/accounts/{account_id}/transactions", response_model=schemas.TransactionPage
 )
-def get_account_transactions(
+async def get_account_transactions(
     account_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: models.User = Security(get_current_user, scopes=["transaction:read"]),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: AuthenticatedPrincipal = Security(
+        get_current_user, scopes=["transaction:read"]
+    ),
 ):
-    db_account = (
-        db.query(models.Account).filter(models.Account.account_id == account_id).first()
+    _, transactions, next_cursor = await _get_transaction_page(
+        db,
+        account_id,
+        current_user.user_id,
+        cursor,
+        limit,
+        forbidden="Not authorized to access these transactions",
     )
-    if db_account is None:
-        raise HTTPException(status_code=404, detail="Account not found")
-    if db_account.user_id != current_user.user_id:
-        raise HTTPException(
-            status_code=403, detail="Not authorized to access these transactions"
-        )
-    transactions = (
-        get_visible_transactions_query(db)
-        .filter(models.Transaction.account_id == db_account.account_id)
-        .order_by(models.Transaction.date.desc())
-        .all()
+    return FastJSONResponse(
+        {
+            "transactions": build_transaction_rows(transactions),
+            "next_cursor": next_cursor,
+        }
+    )
+
+
+async def _stream_transactions_ndjson(account_id):
+    # Uses its own session: the request-scoped one may be closed before the
+    # body is fully sent. yield_per keeps a server-side cursor open and holds
+    # only one batch of rows in memory at a time.
+    today_date = datetime.now(timezone.utc).date()
+    statement = select_account_history_rows(account_id).execution_options(
+        yield_per=EXPORT_BATCH_SIZE
+    )
+    async with read_session() as db:
+        result = await db.stream(statement)
+        async for row in result:
+            yield dumps(build_transaction_row(row, today_date)) + b"\n"
+
+
+@router.get("/accounts/{account_id}/transactions/export")
+async def export_account_transactions(
+    account_id: UUID,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: AuthenticatedPrincipal = Security(
+        get_current_user, scopes=["transaction:read"]
+    ),
+):
+    db_account = ensure_owned(
+        await get_owned_account_row(db, account_id, current_user.user_id),
+        not_found="Account not found",
+        forbidden="Not authorized to access these transactions",
+    )
+    return StreamingResponse(
+        _stream_transactions_ndjson(db_account.account_id),
+        media_type="application/x-ndjson",
     )
-    return build_transaction_list_response(transactions)
@@ -2,17 +2,15 @@ from datetime import timedelta
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from config import ACCESS_TOKEN_EXPIRE_MINUTES
-from database import get_db
+from database import get_async_db
 import models
 import schemas
-from security import (
-    create_access_token,
-    stable_hash,
-    verify_password,
-)
+from security import create_access_token, verify_password_async
+from services.common import find_user_by_phonenumber
 
 router = APIRouter(tags=["Auth"])
 
@@ -20,21 +18,15 @@ router = APIRouter(tags=["Auth"])
 @router.post("/token", response_model=schemas.LoginResponse)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    phone_hash = stable_hash(form_data.username)
-    user = (
-        db.query(models.User)
-        .filter(
-            (models.User.phonenumber_hash == phone_hash)
-            | (models.User.phonenumber == form_data.username)
-        )
-        .first()
+    user = await find_user_by_phonenumber(
+        db, form_data.username, selectinload(models.User.accounts)
     )
     if not user:
         raise HTTPException(status_code=404, detail="Phone number not found")
 
-    if not verify_password(form_data.password, user.hashed_password):
+    if not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=401,
             detail="Incorrect password",
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends
+
+from database import get_async_engine, get_engine
+from pool_telemetry import pool_status
+from read_replicas import replica_router
+from security import AuthenticatedPrincipal, require_roles
+
+router = APIRouter(prefix="/internal", tags=["Internal"], include_in_schema=False)
+
+
+@router.get("/db/pool")
+async def get_db_pool_stats(
+    _: AuthenticatedPrincipal = Depends(require_roles(["admin"])),
+):
+    return {
+        "sync": pool_status(get_engine().pool),
+        "async": pool_status(get_async_engine().sync_engine.pool),
+        "replicas": replica_router.status(),
+    }
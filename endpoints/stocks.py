@@ -2,79 +2,83 @@ from datetime import timezone
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Security
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from database import get_async_db
+from idempotency import IdempotencyContext, idempotent_endpoint
+from read_replicas import get_read_db
 import models
 import schemas
-from security import get_current_user, require_signed_request
+from security import AuthenticatedPrincipal, get_current_user, require_signed_request
+from services.read_models import list_stock_instrument_rows
 
 router = APIRouter(tags=["Stocks"])
 
 
 @router.get("/users/{user_id}/stocks", response_model=list[schemas.StockInstrument])
-def get_user_stocks(
+async def get_user_stocks(
     user_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: models.User = Security(get_current_user, scopes=["stock:read"]),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: AuthenticatedPrincipal = Security(
+        get_current_user, scopes=["stock:read"]
+    ),
 ):
     if current_user.user_id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to access stocks")
 
-    return (
-        db.query(models.StockInstrument)
-        .filter(models.StockInstrument.user_id == str(user_id))
-        .order_by(models.StockInstrument.symbol.asc())
-        .all()
-    )
+    return await list_stock_instrument_rows(db, str(user_id))
 
 
 @router.post("/stocks/", response_model=schemas.StockInstrument)
-def add_stock_instrument(
+async def add_stock_instrument(
     stock: schemas.StockInstrumentCreate,
     request: Request,
     _: None = Depends(require_signed_request),
-    db: Session = Depends(get_db),
-    current_user: models.User = Security(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedPrincipal = Security(
         get_current_user, scopes=["transaction:write"]
     ),
+    idempotency: IdempotencyContext = Depends(idempotent_endpoint("/stocks/")),
 ):
+    # Checked before any replay, so a stored response is never handed to a
+    # caller who could not have made the original request.
     if stock.user_id != str(current_user.user_id):
         raise HTTPException(
             status_code=403, detail="Not authorized to add stock for this user"
         )
 
-    exists = (
-        db.query(models.StockInstrument)
-        .filter(
+    if idempotency.replay is not None:
+        return idempotency.replay
+
+    result = await db.execute(
+        select(models.StockInstrument.id).where(
             models.StockInstrument.user_id == stock.user_id,
             models.StockInstrument.symbol == stock.symbol,
         )
-        .first()
     )
-    if exists:
+    if result.first():
         raise HTTPException(
             status_code=400, detail="Stock symbol already exists for this user"
         )
 
     db_stock = models.StockInstrument(**stock.dict())
     db.add(db_stock)
-    db.commit()
-    db.refresh(db_stock)
-    return db_stock
+    await db.flush()
+    await db.refresh(db_stock)
+    response = schemas.StockInstrument.model_validate(db_stock)
+    await idempotency.commit(response)
+    return response
 
 
 @router.get("/stock-instruments")
-def get_stock_instruments(
-    db: Session = Depends(get_db),
-    current_user: models.User = Security(get_current_user, scopes=["stock:read"]),
+async def get_stock_instruments(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: AuthenticatedPrincipal = Security(
+        get_current_user, scopes=["stock:read"]
+    ),
 ):
-    db_stocks = (
-        db.query(models.StockInstrument)
-        .filter(models.StockInstrument.user_id == str(current_user.user_id))
-        .order_by(models.StockInstrument.symbol.asc())
-        .all()
-    )
+    db_stocks = await list_stock_instrument_rows(db, str(current_user.user_id))
 
     stock_instruments = []
     for stock in db_stocks:
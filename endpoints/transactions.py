@@ -1,85 +1,235 @@
-import json
 from datetime import datetime, timezone
-from uuid import UUID
+from decimal import ROUND_HALF_UP, Decimal
+from uuid import UUID, uuid4
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Security
-from sqlalchemy.orm import Session
+from sqlalchemy import String, cast, exists, func, insert, literal, select, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from database import get_async_db
+from idempotency import (
+    check_idempotency_key,
+    expired_before,
+    recent_response,
+    remember_response,
+    replay_response,
+)
+from read_replicas import get_read_db
 import models
 import schemas
-from security import get_current_user, hash_idempotency_payload, require_signed_request
-from services.common import (
-    build_transaction_response,
-    get_today_utc_end,
-    get_visible_transactions_query,
+from security import (
+    AuthenticatedPrincipal,
+    ensure_owned,
+    get_current_user,
+    hash_idempotency_payload,
+    require_signed_request,
 )
+from services.common import build_transaction_response, get_today_utc_end
+from services.read_models import get_owned_transaction_row, owned_by
 
 router = APIRouter(tags=["Transactions"])
 
+TRANSACTIONS_ENDPOINT = "/transactions/"
+AMOUNT_QUANTUM = Decimal("0.01")
+
 
 @router.get("/transactions/{transaction_id}", response_model=schemas.Transaction)
-def get_transaction(
+async def get_transaction(
     transaction_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: models.User = Security(get_current_user, scopes=["transaction:read"]),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: AuthenticatedPrincipal = Security(
+        get_current_user, scopes=["transaction:read"]
+    ),
 ):
-    db_transaction = (
-        get_visible_transactions_query(db)
-        .filter(models.Transaction.transaction_id == transaction_id)
-        .first()
+    db_transaction = ensure_owned(
+        await get_owned_transaction_row(db, transaction_id, current_user.user_id),
+        not_found="Transaction not found",
+        forbidden="Not authorized to access this transaction",
+    )
+    return build_transaction_response(db_transaction, datetime.now(timezone.utc).date())
+
+
+def _transaction_response(transaction_id, transaction: schemas.TransactionCreate):
+    # Built from the request instead of re-reading the row: the only values the
+    # database changes are the amount (NUMERIC(10,2), rounded half away from
+    # zero like Postgres) and the date's timezone.
+    created_date = transaction.date
+    if created_date.tzinfo is None:
+        created_date = created_date.replace(tzinfo=timezone.utc)
+    created_date = created_date.astimezone(timezone.utc)
+    return schemas.Transaction(
+        transaction_id=transaction_id,
+        account_id=transaction.account_id,
+        date=created_date,
+        amount=float(
+            Decimal(str(transaction.amount)).quantize(
+                AMOUNT_QUANTUM, rounding=ROUND_HALF_UP
+            )
+        ),
+        currency=transaction.currency,
+        type=transaction.type,
+        status=transaction.status,
+        description=transaction.description,
+        merchant=transaction.merchant,
+        category=transaction.category,
+        is_new=created_date.date() == datetime.now(timezone.utc).date(),
+    )
+
+
+def _typed_select(table, values: dict):
+    # Explicit casts: asyncpg types parameters from context, and a bare
+    # SELECT-list parameter would otherwise be sent as text. Strings are cast
+    # to unsized VARCHAR: an explicit cast to VARCHAR(n) silently truncates,
+    # while the assignment to the column rejects over-long values.
+    return select(
+        *(
+            cast(
+                literal(value, type_=table.c[name].type),
+                (
+                    String()
+                    if isinstance(table.c[name].type, String)
+                    else table.c[name].type
+                ),
+            ).label(name)
+            for name, value in values.items()
+        )
+    )
+
+
+def _check_lengths(table, values: dict) -> None:
+    for name, value in values.items():
+        length = getattr(table.c[name].type, "length", None)
+        if length is not None and isinstance(value, str) and len(value) > length:
+            raise HTTPException(
+                status_code=400, detail=f"{name} must be at most {length} characters"
+            )
+
+
+def _reserve_and_insert_statement(
+    idempotency_key: str,
+    request_hash: str,
+    transaction_id,
+    transaction: schemas.TransactionCreate,
+    response: schemas.Transaction,
+    user_id,
+):
+    """One statement that checks ownership, claims the idempotency key and inserts.
+
+    Nothing is written unless the caller owns the target account. The
+    transaction INSERT only runs when the reservation row was written (a new
+    key, or an expired one reclaimed in place). Otherwise the stored record
+    from the statement snapshot is returned for replay. The `owned` column is
+    NULL when the account does not exist.
+    """
+    records = models.IdempotencyRecord.__table__
+    transactions = models.Transaction.__table__
+    account_owned = exists().where(
+        models.Account.account_id == transaction.account_id,
+        models.Account.user_id == user_id,
+    )
+
+    record_values = {
+        "id": uuid4(),
+        "idempotency_key": idempotency_key,
+        "endpoint": TRANSACTIONS_ENDPOINT,
+        "request_hash": request_hash,
+        "response_status_code": 200,
+        "response_body": response.model_dump_json(),
+    }
+    reservation = pg_insert(records).from_select(
+        list(record_values),
+        _typed_select(records, record_values).where(account_owned),
+    )
+    reservation = (
+        reservation.on_conflict_do_update(
+            index_elements=[records.c.idempotency_key],
+            set_={
+                "id": reservation.excluded.id,
+                "endpoint": reservation.excluded.endpoint,
+                "request_hash": reservation.excluded.request_hash,
+                "response_status_code": reservation.excluded.response_status_code,
+                "response_body": reservation.excluded.response_body,
+                "created_at": func.now(),
+            },
+            where=records.c.created_at < expired_before(),
+        )
+        .returning(records.c.id)
+        .cte("reservation")
+    )
+
+    values = {
+        "transaction_id": transaction_id,
+        **transaction.model_dump(),
+        "amount": Decimal(str(transaction.amount)),
+    }
+    inserted = (
+        insert(transactions)
+        .from_select(
+            list(values),
+            _typed_select(transactions, values).where(exists(select(reservation.c.id))),
+        )
+        .returning(transactions.c.transaction_id)
+        .cte("inserted")
     )
-    if db_transaction is None:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-    if db_transaction.account.user_id != current_user.user_id:
+
+    previous = (
+        select(records.c.endpoint, records.c.request_hash, records.c.response_body)
+        .where(records.c.idempotency_key == idempotency_key)
+        .subquery("previous")
+    )
+    anchor = select(literal(1).label("one")).subquery("anchor")
+    return select(
+        select(owned_by(user_id))
+        .where(models.Account.account_id == transaction.account_id)
+        .scalar_subquery()
+        .label("owned"),
+        select(func.count()).select_from(inserted).scalar_subquery().label("created"),
+        previous.c.endpoint,
+        previous.c.request_hash,
+        previous.c.response_body,
+    ).select_from(anchor.outerjoin(previous, true()))
+
+
+def _replay(idempotency_key: str, record, request_hash: str):
+    if record.endpoint != TRANSACTIONS_ENDPOINT or record.request_hash != request_hash:
         raise HTTPException(
-            status_code=403, detail="Not authorized to access this transaction"
+            status_code=409,
+            detail="Idempotency key already used with a different payload",
         )
-    return build_transaction_response(db_transaction, datetime.now(timezone.utc).date())
+    remember_response(
+        idempotency_key, TRANSACTIONS_ENDPOINT, request_hash, 200, record.response_body
+    )
+    return replay_response(200, record.response_body)
 
 
 @router.post("/transactions/", response_model=schemas.Transaction)
-def add_transaction(
+async def add_transaction(
     transaction: schemas.TransactionCreate,
     request: Request,
     _: None = Depends(require_signed_request),
-    db: Session = Depends(get_db),
-    current_user: models.User = Security(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedPrincipal = Security(
         get_current_user, scopes=["transaction:write"]
     ),
 ):
     idempotency_key = request.headers.get("X-Idempotency-Key")
     if not idempotency_key:
         raise HTTPException(status_code=400, detail="Missing X-Idempotency-Key header")
+    check_idempotency_key(idempotency_key)
 
-    request_hash = hash_idempotency_payload(transaction.dict())
-    existing_record = (
-        db.query(models.IdempotencyRecord)
-        .filter(
-            models.IdempotencyRecord.idempotency_key == idempotency_key,
-            models.IdempotencyRecord.endpoint == "/transactions/",
-        )
-        .first()
+    # The caller is part of the hash: cached replays are answered before the
+    # ownership check in the statement, so another user's retry of the same
+    # key and payload must not match.
+    request_hash = hash_idempotency_payload(
+        {
+            "user_id": str(current_user.user_id),
+            "transaction": transaction.model_dump(mode="json"),
+        }
     )
-    if existing_record:
-        if existing_record.request_hash != request_hash:
-            raise HTTPException(
-                status_code=409,
-                detail="Idempotency key already used with a different payload",
-            )
-        return schemas.Transaction(**json.loads(existing_record.response_body))
-
-    db_account = (
-        db.query(models.Account)
-        .filter(models.Account.account_id == transaction.account_id)
-        .first()
-    )
-    if db_account is None:
-        raise HTTPException(status_code=404, detail="Account not found")
-    if db_account.user_id != current_user.user_id:
-        raise HTTPException(
-            status_code=403, detail="Not authorized to add transaction to this account"
-        )
+    cached = recent_response(idempotency_key, TRANSACTIONS_ENDPOINT, request_hash)
+    if cached is not None:
+        return replay_response(*cached)
 
     if transaction.date > get_today_utc_end():
         raise HTTPException(
@@ -87,25 +237,51 @@ def add_transaction(
             detail="Transactions after today's date are not available via this API",
         )
 
-    db_transaction = models.Transaction(**transaction.dict())
-    db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
-    response = build_transaction_response(
-        db_transaction, datetime.now(timezone.utc).date()
-    )
+    _check_lengths(models.Transaction.__table__, transaction.model_dump())
 
-    response_payload = response.dict()
-    response_payload["date"] = response_payload["date"].isoformat()
-    db.add(
-        models.IdempotencyRecord(
-            idempotency_key=idempotency_key,
-            endpoint="/transactions/",
-            request_hash=request_hash,
-            response_status_code=200,
-            response_body=json.dumps(response_payload, separators=(",", ":")),
+    transaction_id = uuid4()
+    response = _transaction_response(transaction_id, transaction)
+    result = await db.execute(
+        _reserve_and_insert_statement(
+            idempotency_key,
+            request_hash,
+            transaction_id,
+            transaction,
+            response,
+            current_user.user_id,
         )
     )
-    db.commit()
+    outcome = ensure_owned(
+        result.one(),
+        not_found="Account not found",
+        forbidden="Not authorized to add transaction to this account",
+    )
+    await db.commit()
 
-    return response
+    if outcome.created:
+        remember_response(
+            idempotency_key,
+            TRANSACTIONS_ENDPOINT,
+            request_hash,
+            200,
+            response.model_dump_json(),
+        )
+        return response
+    if outcome.request_hash is not None:
+        return _replay(idempotency_key, outcome, request_hash)
+
+    # The key was committed by a concurrent request after this statement's
+    # snapshot was taken; it is visible to a fresh read unless that record has
+    # since expired or been swept.
+    result = await db.execute(
+        select(models.IdempotencyRecord).where(
+            models.IdempotencyRecord.idempotency_key == idempotency_key
+        )
+    )
+    record = result.scalars().first()
+    if record is None:
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this idempotency key is being processed",
+        )
+    return _replay(idempotency_key, record, request_hash)
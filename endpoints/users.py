@@ -1,50 +1,58 @@
 from uuid import UUID, uuid4
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Security
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from database import get_db
+from database import get_async_db
+from read_replicas import get_read_db
 from encryption_service import encrypt
+from idempotency import IdempotencyContext, idempotent_endpoint
 import models
 import schemas
 from security import (
+    AuthenticatedPrincipal,
     get_current_user,
-    get_password_hash,
+    get_password_hash_async,
+    invalidate_principal,
     require_signed_request,
     stable_hash,
 )
-from services.common import build_user_response
+from services.common import (
+    build_user_response,
+    find_user_by_phonenumber,
+    purge_user_pii,
+)
+from services.read_models import list_account_rows
 
 router = APIRouter(tags=["Users"])
 
 
 @router.post("/users/", response_model=schemas.User)
-def create_user(
+async def create_user(
     user: schemas.UserCreate,
     request: Request,
     _: None = Depends(require_signed_request),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
+    idempotency: IdempotencyContext = Depends(idempotent_endpoint("/users/")),
 ):
+    if idempotency.replay is not None:
+        return idempotency.replay
+
     phone_hash = stable_hash(user.phonenumber)
-    db_user = (
-        db.query(models.User)
-        .filter(
-            (models.User.phonenumber_hash == phone_hash)
-            | (models.User.phonenumber == user.phonenumber)
-        )
-        .first()
-    )
-    if db_user:
+    if await find_user_by_phonenumber(db, user.phonenumber):
         raise HTTPException(status_code=400, detail="Phone number already registered")
 
     email_hash = stable_hash(user.email) if user.email else None
-    if (
-        email_hash
-        and db.query(models.User).filter(models.User.email_hash == email_hash).first()
-    ):
-        raise HTTPException(status_code=400, detail="Email already registered")
+    if email_hash:
+        result = await db.execute(
+            select(models.User.user_id).where(models.User.email_hash == email_hash)
+        )
+        if result.first():
+            raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     user_id = uuid4()
     db_user = models.User(
         user_id=user_id,
@@ -60,45 +68,62 @@ def create_user(
         hashed_password=hashed_password,
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return build_user_response(db_user)
+    await db.flush()
+    await db.refresh(db_user, attribute_names=["created_at", "role", "accounts"])
+    response = build_user_response(db_user)
+    await idempotency.commit(response)
+    invalidate_principal(db_user.user_id)
+    purge_user_pii(db_user.user_id)
+    return response
 
 
 @router.get("/users/me/", response_model=schemas.User)
 async def read_users_me(
-    current_user: models.User = Security(get_current_user, scopes=["account:read"])
+    current_user: AuthenticatedPrincipal = Security(
+        get_current_user, scopes=["account:read"]
+    )
 ):
     return build_user_response(current_user)
 
 
+async def _get_user_with_accounts(db: AsyncSession, user_id: UUID):
+    result = await db.execute(
+        select(models.User)
+        .options(selectinload(models.User.accounts))
+        .where(models.User.user_id == user_id)
+    )
+    return result.scalars().first()
+
+
 @router.get("/users/{user_id}", response_model=schemas.User)
-def get_user(
+async def get_user(
     user_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: models.User = Security(get_current_user, scopes=["account:read"]),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: AuthenticatedPrincipal = Security(
+        get_current_user, scopes=["account:read"]
+    ),
 ):
     if current_user.user_id != user_id:
         raise HTTPException(
             status_code=403, detail="Not authorized to access this user"
         )
-    db_user = db.query(models.User).filter(models.User.user_id == user_id).first()
+    db_user = await _get_user_with_accounts(db, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return build_user_response(db_user)
 
 
 @router.get("/users/{user_id}/accounts", response_model=list[schemas.Account])
-def get_user_accounts(
+async def get_user_accounts(
     user_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: models.User = Security(get_current_user, scopes=["account:read"]),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: AuthenticatedPrincipal = Security(
+        get_current_user, scopes=["account:read"]
+    ),
 ):
     if current_user.user_id != user_id:
         raise HTTPException(
             status_code=403, detail="Not authorized to access these accounts"
         )
-    db_user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    return db_user.accounts
+    # The authenticated principal is this user, so only the accounts are read.
+    return await list_account_rows(db, user_id)
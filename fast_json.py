@@ -0,0 +1,23 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import Response
+
+
+def dumps(content: Any) -> bytes:
+    # OPT_UTC_Z keeps UTC timestamps as "...Z", the way pydantic writes them.
+    return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with orjson, bypassing FastAPI's response_model pass.
+
+    orjson serializes UUID, datetime and dict/list values natively, so
+    handlers can return rows built from database tuples without a pydantic
+    round trip. Callers are responsible for matching the declared schema.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
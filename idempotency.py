@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+from datetime import timedelta
+from typing import Optional
+from uuid import uuid4
+
+from fastapi import Depends, HTTPException, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from config import (
+    IDEMPOTENCY_CACHE_MAX_ENTRIES,
+    IDEMPOTENCY_CACHE_TTL_SECONDS,
+    IDEMPOTENCY_PENDING_TIMEOUT_SECONDS,
+    IDEMPOTENCY_SWEEP_BATCH_SIZE,
+    IDEMPOTENCY_SWEEP_SECONDS,
+    IDEMPOTENCY_TTL_SECONDS,
+)
+from database import AsyncSessionLocal, get_async_db
+from encryption_service import encrypt, safe_decrypt
+from ttl_cache import TTLCache
+
+IDEMPOTENCY_HEADER = "X-Idempotency-Key"
+# response_status_code of a reservation whose request is still being processed.
+PENDING_STATUS_CODE = 0
+
+# idempotency key -> (endpoint, request hash, status code, response body) for
+# completed requests, so retry storms are answered without a database read.
+# Bodies are kept exactly as stored, so sealed bodies stay sealed here too.
+_recent_responses = TTLCache(
+    max_entries=IDEMPOTENCY_CACHE_MAX_ENTRIES,
+    default_ttl=min(IDEMPOTENCY_CACHE_TTL_SECONDS, IDEMPOTENCY_TTL_SECONDS),
+)
+
+
+def check_idempotency_key(key: str) -> None:
+    # Checked up front: a longer key cannot be stored, and must not be cut down
+    # to a prefix that another key could share.
+    max_length = models.IdempotencyRecord.__table__.c.idempotency_key.type.length
+    if len(key) > max_length:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{IDEMPOTENCY_HEADER} must be at most {max_length} characters",
+        )
+
+
+def expired_before():
+    """SQL expression for the created_at cutoff of expired idempotency records."""
+    return func.now() - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+
+
+def _body_aad(key: str, endpoint: str) -> str:
+    return f"idempotency_response:{endpoint}:{key}"
+
+
+def seal_response_body(key: str, endpoint: str, body: str) -> str:
+    """Encrypt a stored response body; responses may carry decrypted PII."""
+    return encrypt(body, aad=_body_aad(key, endpoint))
+
+
+def open_response_body(key: str, endpoint: str, body: str) -> str:
+    # Bodies stored before sealing was introduced are returned as they are.
+    return safe_decrypt(body, aad=_body_aad(key, endpoint))
+
+
+def remember_response(
+    key: str, endpoint: str, request_hash: str, status_code: int, body: str
+) -> None:
+    _recent_responses.set(key, (endpoint, request_hash, status_code, body))
+
+
+def recent_response(key: str, endpoint: str, request_hash: str) -> Optional[tuple]:
+    """Return (status_code, body) of a cached completed request, or None.
+
+    Raises 409 when the key was used for a different endpoint or payload.
+    """
+    cached = _recent_responses.get(key)
+    if cached is None:
+        return None
+    cached_endpoint, cached_hash, status_code, body = cached
+    if cached_endpoint != endpoint or cached_hash != request_hash:
+        raise _key_reused()
+    return status_code, body
+
+
+def _key_reused() -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail="Idempotency key already used with a different payload",
+    )
+
+
+def replay_response(status_code: int, body: str) -> Response:
+    return Response(
+        content=body,
+        status_code=status_code,
+        media_type="application/json",
+        headers={"X-Idempotent-Replay": "true"},
+    )
+
+
+class IdempotencyContext:
+    """Per-request idempotency state handed to an opted-in route.
+
+    `replay` holds the stored response when the key was already completed;
+    the route returns it as-is. Otherwise the route does its work in the
+    request session and finishes with `commit`, which writes the response into
+    the reservation and commits both in one transaction.
+    """
+
+    def __init__(self, db: AsyncSession, key=None, endpoint=None, request_hash=None):
+        self.db = db
+        self.key = key
+        self.endpoint = endpoint
+        self.request_hash = request_hash
+        self.replay: Optional[Response] = None
+        self.reservation_id = None
+
+    async def commit(self, response: BaseModel, status_code: int = 200) -> None:
+        if self.reservation_id is None:
+            await self.db.commit()
+            return
+        body = seal_response_body(self.key, self.endpoint, response.model_dump_json())
+        records = models.IdempotencyRecord
+        await self.db.execute(
+            update(records)
+            .where(records.id == self.reservation_id)
+            .values(response_status_code=status_code, response_body=body)
+        )
+        await self.db.commit()
+        remember_response(self.key, self.endpoint, self.request_hash, status_code, body)
+
+
+async def _reserve(context: IdempotencyContext):
+    """Claim the key with a pending record; return the existing record if taken.
+
+    Runs in the request session and is not committed here: the reservation
+    becomes visible together with the route's work, and a concurrent request
+    for the same key waits on it instead of racing it. A failed request rolls
+    the reservation back with everything else.
+    """
+    records = models.IdempotencyRecord.__table__
+    reservation_id = uuid4()
+    statement = pg_insert(records).values(
+        id=reservation_id,
+        idempotency_key=context.key,
+        endpoint=context.endpoint,
+        request_hash=context.request_hash,
+        response_status_code=PENDING_STATUS_CODE,
+        response_body="",
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[records.c.idempotency_key],
+        set_={
+            "id": statement.excluded.id,
+            "endpoint": statement.excluded.endpoint,
+            "request_hash": statement.excluded.request_hash,
+            "response_status_code": statement.excluded.response_status_code,
+            "response_body": statement.excluded.response_body,
+            "created_at": func.now(),
+        },
+        # Reclaim expired keys, and pending rows that were committed without a
+        # response (a route that committed on its own instead of via commit).
+        where=or_(
+            records.c.created_at < expired_before(),
+            (records.c.response_status_code == PENDING_STATUS_CODE)
+            & (
+                records.c.created_at
+                < func.now() - timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT_SECONDS)
+            ),
+        ),
+    ).returning(records.c.id)
+
+    db = context.db
+    reserved = (await db.execute(statement)).first()
+    if reserved is not None:
+        context.reservation_id = reservation_id
+        return None
+    return (
+        await db.execute(
+            select(
+                records.c.endpoint,
+                records.c.request_hash,
+                records.c.response_status_code,
+                records.c.response_body,
+            ).where(records.c.idempotency_key == context.key)
+        )
+    ).first()
+
+
+def idempotent_endpoint(endpoint: str):
+    """Dependency factory that makes a POST route honour X-Idempotency-Key.
+
+    The header is optional: without it the route runs normally. With it, the
+    first request reserves the key, later retries get the stored response (from
+    the in-process cache when possible), and a failed request leaves nothing
+    behind, so the client can retry. The route must declare its session with
+    Depends(get_async_db) so both share it.
+    """
+
+    async def _idempotency(request: Request, db: AsyncSession = Depends(get_async_db)):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return IdempotencyContext(db)
+
+        check_idempotency_key(key)
+        request_hash = hashlib.sha256(await request.body()).hexdigest()
+        context = IdempotencyContext(db, key, endpoint, request_hash)
+
+        cached = recent_response(key, endpoint, request_hash)
+        if cached is not None:
+            status_code, body = cached
+            context.replay = replay_response(
+                status_code, open_response_body(key, endpoint, body)
+            )
+            return context
+
+        existing = await _reserve(context)
+        if context.reservation_id is None:
+            if existing is None:
+                # The holder expired or was swept between our two statements.
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this idempotency key is being processed",
+                )
+            if existing.endpoint != endpoint or existing.request_hash != request_hash:
+                raise _key_reused()
+            if existing.response_status_code == PENDING_STATUS_CODE:
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this idempotency key is being processed",
+                )
+            remember_response(
+                key,
+                endpoint,
+                request_hash,
+                existing.response_status_code,
+                existing.response_body,
+            )
+            context.replay = replay_response(
+                existing.response_status_code,
+                open_response_body(key, endpoint, existing.response_body),
+            )
+        return context
+
+    return _idempotency
+
+
+async def purge_expired_idempotency_records(
+    batch_size: int = IDEMPOTENCY_SWEEP_BATCH_SIZE,
+) -> int:
+    records = models.IdempotencyRecord
+    purged = 0
+    while True:
+        # Short batches keep row locks brief; SKIP LOCKED lets several workers
+        # sweep at once without waiting on each other.
+        batch = (
+            select(records.id)
+            .where(records.created_at < expired_before())
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(delete(records).where(records.id.in_(batch)))
+            await db.commit()
+        purged += result.rowcount
+        if result.rowcount < batch_size:
+            return purged
+
+
+async def sweep_expired_idempotency_records(
+    interval: float = IDEMPOTENCY_SWEEP_SECONDS,
+) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            purged = await purge_expired_idempotency_records()
+            if purged:
+                print(f"Purged {purged} expired idempotency records")
+        except Exception as e:
+            print(f"Idempotency record sweep failed: {e}")
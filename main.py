@@ -1,32 +1,88 @@
+import asyncio
 from contextlib import asynccontextmanager
 
+import anyio.to_thread
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
-import models
-from config import APP_ENV, ENFORCE_HTTPS
-from database import SessionLocal, engine, run_bootstrap_migrations
+from config import (
+    APP_ENV,
+    ENFORCE_HTTPS,
+    STOCK_SEED_MODE,
+    THREADPOOL_MAX_WORKERS,
+    TRANSACTIONS_PARTITIONED,
+)
+from database import get_async_engine, wait_for_database
 from endpoints import api_router
-from services import seed_stock_instruments
+from idempotency import sweep_expired_idempotency_records
+from migrations import check_expected_indexes, run_migrations
+from partitions import ensure_transaction_partitions, maintain_transaction_partitions
+from read_replicas import replica_router
+from seed_stocks import run_stock_seed
+from startup import run_startup_tasks_once
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    print("Creating database tables (if not exist)...")
-    models.Base.metadata.create_all(bind=engine)
-    run_bootstrap_migrations()
+def run_startup_tasks():
+    print("Checking database schema...")
+    run_migrations()
+    try:
+        ensure_transaction_partitions()
+    except Exception as e:
+        # Missing partitions only send rows to the default partition; the
+        # daily maintenance task retries.
+        print(f"Transaction partition setup failed: {e}")
+    check_expected_indexes()
     print("Tables ready!")
 
-    db = SessionLocal()
+    if STOCK_SEED_MODE == "startup":
+        run_stock_seed()
+
+
+async def seed_stocks_in_background():
     try:
-        seed_stock_instruments(db)
-        print("Stock instruments seeded (if missing).")
-    finally:
-        db.close()
+        await asyncio.to_thread(run_stock_seed)
+    except Exception as e:
+        print(f"Background stock seeding failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync route dependencies run on anyio's threadpool. Startup work uses
+    # asyncio.to_thread instead, and the sync engine's own small pool.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = (
+        THREADPOOL_MAX_WORKERS
+    )
+    await wait_for_database()
+    is_startup_leader = await run_startup_tasks_once(run_startup_tasks)
+
+    # Like the startup tasks, the seed runs once per deployment, in the leader.
+    stock_seed_task = None
+    if STOCK_SEED_MODE == "background" and is_startup_leader:
+        stock_seed_task = asyncio.create_task(seed_stocks_in_background())
+
+    idempotency_sweep_task = asyncio.create_task(sweep_expired_idempotency_records())
+
+    partition_task = None
+    if TRANSACTIONS_PARTITIONED:
+        partition_task = asyncio.create_task(maintain_transaction_partitions())
+
+    replica_lag_task = None
+    if replica_router.enabled:
+        await replica_router.check_lag()
+        replica_lag_task = asyncio.create_task(replica_router.monitor())
 
     yield
     print("Shutting down app...")
+    idempotency_sweep_task.cancel()
+    if partition_task is not None:
+        partition_task.cancel()
+    if replica_lag_task is not None:
+        replica_lag_task.cancel()
+        await replica_router.dispose()
+    if stock_seed_task is not None and not stock_seed_task.done():
+        await stock_seed_task
+    await get_async_engine().dispose()
 
 
 app = FastAPI(
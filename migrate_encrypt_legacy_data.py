@@ -1,91 +1,305 @@
+import argparse
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from sqlalchemy import and_, func, not_, or_, select, update
 from sqlalchemy.orm import Session
 
 import models
-from database import SessionLocal, run_bootstrap_migrations
+from database import SessionLocal
+from migrations import run_migrations
 from encryption_service import (
+    ENVELOPE_V2_PREFIX,
     encrypt,
     stable_hash,
     looks_encrypted,
     mask_account_number,
 )
+from services.common import PHONE_HASH_BACKFILL_FLAG
 
+DEFAULT_BATCH_SIZE = 500
+# v1 envelopes are compact sort_keys JSON, so they always open with this.
+V1_ENVELOPE_PREFIX = '{"alg":'
 
-def migrate_users(db: Session) -> int:
-    updated = 0
-    users = db.query(models.User).all()
-    for user in users:
-        changed = False
 
-        if user.phonenumber and not user.phonenumber_encrypted:
-            user.phonenumber_encrypted = encrypt(
-                user.phonenumber, aad=f"user_phone:{user.user_id}"
+def encrypt_user_rows(rows):
+    # Runs in a worker process; returns parameter sets for a bulk UPDATE.
+    updates = []
+    for user_id, phonenumber, phonenumber_encrypted, phonenumber_hash in rows:
+        values = {}
+        if phonenumber and not phonenumber_encrypted:
+            values["phonenumber_encrypted"] = encrypt(
+                phonenumber, aad=f"user_phone:{user_id}"
             )
-            user.phonenumber_hash = stable_hash(user.phonenumber)
+            values["phonenumber_hash"] = stable_hash(phonenumber)
             # Keep plaintext temporarily for compatibility with legacy schemas.
             # You can null this field in a later cleanup after verifying constraints.
-            changed = True
-
-        if changed:
-            updated += 1
+        elif phonenumber and not phonenumber_hash:
+            # Rows encrypted by an older build may carry ciphertext but no lookup hash.
+            values["phonenumber_hash"] = stable_hash(phonenumber)
 
-    return updated
+        if values:
+            values["user_id"] = user_id
+            updates.append(values)
+    return updates
 
 
-def migrate_accounts(db: Session) -> int:
-    updated = 0
-    accounts = db.query(models.Account).all()
-    for account in accounts:
-        changed = False
+def encrypt_account_rows(rows):
+    # Runs in a worker process; returns parameter sets for a bulk UPDATE.
+    updates = []
+    for account_id, account_number_masked, account_number_encrypted in rows:
+        values = {}
 
         # Legacy rows may only have masked values. We avoid attempting to reconstruct
         # real account numbers; we simply encrypt what is available.
-        if not account.account_number_encrypted and account.account_number_masked:
+        if not account_number_encrypted and account_number_masked:
             # Legacy imports often contain only masked numbers like '**' or '****'.
             # Use a per-account deterministic hash to avoid collisions on unique index.
-            legacy_hash_input = f"{account.account_id}:{account.account_number_masked}"
-            account.account_number_encrypted = encrypt(
-                account.account_number_masked,
-                aad=f"account_number:{account.account_id}",
+            legacy_hash_input = f"{account_id}:{account_number_masked}"
+            values["account_number_encrypted"] = encrypt(
+                account_number_masked, aad=f"account_number:{account_id}"
             )
-            account.account_number_hash = stable_hash(legacy_hash_input)
-            account.account_number_masked = mask_account_number(
-                account.account_number_masked
+            values["account_number_hash"] = stable_hash(legacy_hash_input)
+            values["account_number_masked"] = mask_account_number(account_number_masked)
+        elif account_number_encrypted and not looks_encrypted(account_number_encrypted):
+            values["account_number_encrypted"] = encrypt(
+                account_number_encrypted, aad=f"account_number:{account_id}"
             )
-            changed = True
-
-        if account.account_number_encrypted and not looks_encrypted(
-            account.account_number_encrypted
-        ):
-            account.account_number_encrypted = encrypt(
-                account.account_number_encrypted,
-                aad=f"account_number:{account.account_id}",
+
+        if values:
+            values["account_id"] = account_id
+            updates.append(values)
+    return updates
+
+
+USER_MIGRATION = {
+    "name": "encrypt_users",
+    "model": models.User,
+    "key": models.User.user_id,
+    "columns": [
+        models.User.user_id,
+        models.User.phonenumber,
+        models.User.phonenumber_encrypted,
+        models.User.phonenumber_hash,
+    ],
+    "pending": and_(
+        models.User.phonenumber.isnot(None),
+        or_(
+            models.User.phonenumber_encrypted.is_(None),
+            models.User.phonenumber_hash.is_(None),
+        ),
+    ),
+    "worker": encrypt_user_rows,
+}
+
+ACCOUNT_MIGRATION = {
+    "name": "encrypt_accounts",
+    "model": models.Account,
+    "key": models.Account.account_id,
+    "columns": [
+        models.Account.account_id,
+        models.Account.account_number_masked,
+        models.Account.account_number_encrypted,
+    ],
+    # Cheap SQL pre-filter that skips anything shaped like an envelope;
+    # encrypt_account_rows re-checks the rest with looks_encrypted.
+    "pending": or_(
+        models.Account.account_number_encrypted.is_(None),
+        not_(
+            or_(
+                models.Account.account_number_encrypted.startswith(V1_ENVELOPE_PREFIX),
+                models.Account.account_number_encrypted.startswith(ENVELOPE_V2_PREFIX),
             )
-            changed = True
+        ),
+    ),
+    "worker": encrypt_account_rows,
+}
+
+
+class InlineExecutor:
+    # Stand-in for ProcessPoolExecutor when --workers 0 is requested.
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def iter_pending_pages(migration, after, batch_size):
+    # Keyset pagination: every page is a short, index-ordered read that starts
+    # after the last key seen, so no long-lived snapshot or OFFSET scan is needed.
+    key = migration["key"]
+    while True:
+        statement = (
+            select(*migration["columns"])
+            .where(migration["pending"])
+            .order_by(key)
+            .limit(batch_size)
+        )
+        if after is not None:
+            statement = statement.where(key > after)
+
+        with SessionLocal() as reader:
+            rows = [tuple(row) for row in reader.execute(statement)]
+        if not rows:
+            return
+        after = rows[-1][0]
+        yield rows
+
+
+def count_pending(migration, after) -> int:
+    statement = select(func.count()).where(migration["pending"])
+    if after is not None:
+        statement = statement.where(migration["key"] > after)
+    with SessionLocal() as reader:
+        return reader.execute(statement).scalar_one()
+
+
+def save_checkpoint(db: Session, name, last_key, scanned, updated, completed=False):
+    db.merge(
+        models.MigrationCheckpoint(
+            name=name,
+            last_key=str(last_key) if last_key is not None else None,
+            rows_scanned=scanned,
+            rows_updated=updated,
+            completed=completed,
+        )
+    )
 
-        if changed:
-            updated += 1
 
+def run_table_migration(migration, executor, batch_size, max_in_flight, restart):
+    name = migration["name"]
+    after, scanned, updated = None, 0, 0
+    if not restart:
+        with SessionLocal() as db:
+            checkpoint = db.get(models.MigrationCheckpoint, name)
+        # A completed checkpoint only records the last run; rows loaded since
+        # then are found by the pending filter, so the scan starts over.
+        if checkpoint is not None and not checkpoint.completed:
+            if checkpoint.last_key:
+                after = uuid.UUID(checkpoint.last_key)
+            scanned, updated = checkpoint.rows_scanned, checkpoint.rows_updated
+            print(f"[{name}] resuming after {after} ({scanned} rows already scanned)")
+
+    total = scanned + count_pending(migration, after)
+    started = time.monotonic()
+    session_scanned = 0
+    pages = iter_pending_pages(migration, after, batch_size)
+    in_flight = deque()
+
+    while True:
+        while len(in_flight) < max_in_flight:
+            rows = next(pages, None)
+            if rows is None:
+                break
+            in_flight.append(
+                (rows[-1][0], len(rows), executor.submit(migration["worker"], rows))
+            )
+        if not in_flight:
+            break
+
+        # Chunks are applied in key order so the checkpoint never skips past an
+        # unapplied chunk; each chunk's UPDATE and checkpoint commit together.
+        last_key, page_size, future = in_flight.popleft()
+        updates = future.result()
+        with SessionLocal() as db:
+            if updates:
+                db.execute(update(migration["model"]), updates)
+            scanned += page_size
+            updated += len(updates)
+            save_checkpoint(db, name, last_key, scanned, updated)
+            db.commit()
+
+        session_scanned += page_size
+        elapsed = time.monotonic() - started
+        rate = session_scanned / elapsed if elapsed > 0 else 0.0
+        percent = 100.0 * scanned / total if total else 100.0
+        print(
+            f"[{name}] {scanned}/{total} rows ({percent:.1f}%), "
+            f"{updated} updated, {rate:.0f} rows/s"
+        )
+
+    with SessionLocal() as db:
+        save_checkpoint(db, name, None, scanned, updated, completed=True)
+        db.commit()
+    print(f"[{name}] done in {time.monotonic() - started:.1f}s")
     return updated
 
 
-def run_migration():
+def mark_phone_hash_backfill_complete(db: Session) -> bool:
+    missing_hash = (
+        db.query(models.User.user_id)
+        .filter(
+            models.User.phonenumber.isnot(None),
+            models.User.phonenumber_hash.is_(None),
+        )
+        .first()
+    )
+    if missing_hash is not None:
+        return False
+
+    # Once set, /token and create_user look users up by phonenumber_hash only.
+    db.merge(models.SystemFlag(name=PHONE_HASH_BACKFILL_FLAG, enabled=True))
+    return True
+
+
+def run_migration(
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = os.cpu_count() or 1,
+    restart: bool = False,
+):
     # Ensure legacy databases get required columns before ORM loads mapped fields.
-    run_bootstrap_migrations()
+    run_migrations()
 
-    db = SessionLocal()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers else InlineExecutor()
+    max_in_flight = max(1, workers) * 2
     try:
-        user_count = migrate_users(db)
-        account_count = migrate_accounts(db)
-        db.commit()
-        print(
-            f"Migration completed. Users updated: {user_count}, Accounts updated: {account_count}"
+        user_count = run_table_migration(
+            USER_MIGRATION, executor, batch_size, max_in_flight, restart
+        )
+        account_count = run_table_migration(
+            ACCOUNT_MIGRATION, executor, batch_size, max_in_flight, restart
         )
-    except Exception:
-        db.rollback()
-        raise
     finally:
-        db.close()
+        executor.shutdown(wait=True)
+
+    with SessionLocal() as db:
+        hash_only_lookup = mark_phone_hash_backfill_complete(db)
+        db.commit()
+    print(
+        f"Migration completed. Users updated: {user_count}, Accounts updated: {account_count}"
+    )
+    if hash_only_lookup:
+        print("All phone numbers are hashed; plaintext phone lookups disabled.")
 
 
 if __name__ == "__main__":
-    run_migration()
+    parser = argparse.ArgumentParser(
+        description="Encrypt legacy plaintext PII in batches, resuming from checkpoints."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Rows per keyset page, encryption chunk and commit.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Encryption worker processes (0 encrypts in the main process).",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore an interrupted run's checkpoint and scan every table from the start.",
+    )
+    args = parser.parse_args()
+    run_migration(
+        batch_size=args.batch_size, workers=args.workers, restart=args.restart
+    )
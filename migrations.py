@@ -0,0 +1,213 @@
+import re
+import time
+
+from sqlalchemy import Engine, text
+from sqlalchemy.exc import ProgrammingError
+
+import models
+from database import get_engine
+
+# Each step runs once and is recorded in schema_migrations. Steps with
+# "statements" run in one transaction together with their ledger row; steps with
+# "indexes" are built with CREATE INDEX CONCURRENTLY, which cannot run inside a
+# transaction and does not block writes on the indexed table.
+MIGRATIONS = [
+    {
+        "version": 1,
+        "name": "pii_and_iso20022_columns",
+        "statements": [
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS phonenumber_encrypted VARCHAR",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS phonenumber_hash VARCHAR(64)",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS email_encrypted VARCHAR",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS email_hash VARCHAR(64)",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS role VARCHAR(30) NOT NULL DEFAULT 'customer'",
+            "ALTER TABLE users ALTER COLUMN phonenumber DROP NOT NULL",
+            "ALTER TABLE accounts ADD COLUMN IF NOT EXISTS account_number_encrypted VARCHAR",
+            "ALTER TABLE accounts ADD COLUMN IF NOT EXISTS account_number_hash VARCHAR(64)",
+            "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS category_purpose_code VARCHAR(4) NOT NULL DEFAULT 'OTHR'",
+            "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS mcc INTEGER NOT NULL DEFAULT 5999",
+            "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS proprietary_bank_code VARCHAR(20) NOT NULL DEFAULT 'GIBL-FT-01'",
+            "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS merchant_logo_url VARCHAR",
+            "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS merchant_verified_status BOOLEAN NOT NULL DEFAULT false",
+        ],
+    },
+    {
+        "version": 2,
+        "name": "idempotency_records",
+        "statements": [
+            "CREATE TABLE IF NOT EXISTS idempotency_records (id UUID PRIMARY KEY, idempotency_key VARCHAR(128) NOT NULL UNIQUE, endpoint VARCHAR(128) NOT NULL, request_hash VARCHAR(64) NOT NULL, response_status_code INTEGER NOT NULL, response_body VARCHAR NOT NULL, created_at TIMESTAMPTZ NOT NULL DEFAULT NOW())",
+        ],
+    },
+    {
+        "version": 3,
+        "name": "pii_lookup_indexes",
+        "indexes": {
+            "ix_users_phonenumber_hash": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_phonenumber_hash ON users (phonenumber_hash)",
+            "uq_users_email_hash": "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_users_email_hash ON users (email_hash)",
+            "uq_accounts_account_number_hash": "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_accounts_account_number_hash ON accounts (account_number_hash)",
+            "ix_idempotency_records_idempotency_key": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_idempotency_records_idempotency_key ON idempotency_records (idempotency_key)",
+        },
+    },
+    {
+        "version": 4,
+        "name": "system_flags",
+        "statements": [
+            "CREATE TABLE IF NOT EXISTS system_flags (name VARCHAR(64) PRIMARY KEY, enabled BOOLEAN NOT NULL DEFAULT false, updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW())",
+        ],
+    },
+    {
+        "version": 5,
+        "name": "request_nonces",
+        "statements": [
+            "CREATE TABLE IF NOT EXISTS request_nonces (request_id_hash VARCHAR(64) PRIMARY KEY, expires_at TIMESTAMPTZ NOT NULL)",
+        ],
+    },
+    {
+        "version": 6,
+        "name": "request_nonces_expiry_index",
+        "indexes": {
+            "ix_request_nonces_expires_at": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_request_nonces_expires_at ON request_nonces (expires_at)",
+        },
+    },
+    {
+        "version": 7,
+        "name": "migration_checkpoints",
+        "statements": [
+            "CREATE TABLE IF NOT EXISTS migration_checkpoints (name VARCHAR(64) PRIMARY KEY, last_key VARCHAR(64), rows_scanned BIGINT NOT NULL DEFAULT 0, rows_updated BIGINT NOT NULL DEFAULT 0, completed BOOLEAN NOT NULL DEFAULT false, updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW())",
+        ],
+    },
+    {
+        "version": 8,
+        "name": "hot_path_indexes",
+        "indexes": {
+            "ix_transactions_account_id_date": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_account_id_date ON transactions (account_id, date DESC) INCLUDE (transaction_id, amount, currency, type, status, description, merchant, category)",
+            "ix_accounts_user_id": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_accounts_user_id ON accounts (user_id)",
+            "ix_idempotency_records_key_endpoint": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_idempotency_records_key_endpoint ON idempotency_records (idempotency_key, endpoint)",
+        },
+    },
+    {
+        "version": 9,
+        "name": "idempotency_expiry_index",
+        "indexes": {
+            "ix_idempotency_records_created_at": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_idempotency_records_created_at ON idempotency_records (created_at)",
+        },
+    },
+]
+
+LATEST_VERSION = max(migration["version"] for migration in MIGRATIONS)
+
+_RECORD_VERSION = text(
+    "INSERT INTO schema_migrations (version, name) VALUES (:version, :name) "
+    "ON CONFLICT (version) DO NOTHING"
+)
+
+
+def get_schema_version(engine: Engine) -> int:
+    with engine.connect() as conn:
+        try:
+            return conn.execute(
+                text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+            ).scalar_one()
+        except ProgrammingError:
+            # Fresh or pre-ledger database.
+            return 0
+
+
+def _drop_invalid_index(conn, index_name: str) -> None:
+    # A failed CONCURRENTLY build leaves an INVALID index behind that
+    # IF NOT EXISTS would silently accept; drop it so the step can be retried.
+    invalid = conn.execute(
+        text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ),
+        {"name": index_name},
+    ).first()
+    if invalid:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+
+
+def _partitioned_tables(conn) -> set:
+    return set(
+        conn.execute(
+            text(
+                "SELECT c.relname FROM pg_partitioned_table p "
+                "JOIN pg_class c ON c.oid = p.partrelid"
+            )
+        ).scalars()
+    )
+
+
+def _apply(engine: Engine, migration: dict) -> None:
+    params = {"version": migration["version"], "name": migration["name"]}
+    if "indexes" in migration:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            partitioned = _partitioned_tables(conn)
+            for index_name, statement in migration["indexes"].items():
+                # Postgres cannot build an index on a partitioned parent
+                # CONCURRENTLY; it is created per partition in one pass instead.
+                table = re.search(r" ON (\w+) ", statement).group(1)
+                if table in partitioned:
+                    statement = statement.replace(" CONCURRENTLY", "")
+                _drop_invalid_index(conn, index_name)
+                conn.execute(text(statement))
+            conn.execute(_RECORD_VERSION, params)
+        return
+
+    with engine.begin() as conn:
+        for statement in migration["statements"]:
+            conn.execute(text(statement))
+        conn.execute(_RECORD_VERSION, params)
+
+
+def check_expected_indexes(engine: Engine = None) -> list:
+    """Warn about managed indexes that are missing or invalid; return their names."""
+    engine = engine or get_engine()
+    if engine.dialect.name != "postgresql":
+        return []
+
+    expected = [name for m in MIGRATIONS for name in m.get("indexes", {})]
+    with engine.connect() as conn:
+        valid = set(
+            conn.execute(
+                text(
+                    "SELECT c.relname FROM pg_index i "
+                    "JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE c.relname = ANY(:names) AND i.indisvalid"
+                ),
+                {"names": expected},
+            ).scalars()
+        )
+    missing = [name for name in expected if name not in valid]
+    for name in missing:
+        print(f"WARNING: expected index {name} is missing or invalid")
+    return missing
+
+
+def run_migrations(engine: Engine = None) -> int:
+    """Bring the schema up to date and return the number of steps applied."""
+    engine = engine or get_engine()
+
+    current = get_schema_version(engine)
+    if current >= LATEST_VERSION:
+        print(f"Schema is up to date (version {current}).")
+        return 0
+
+    # create_all still covers brand new tables (including the ledger itself);
+    # it only runs when there is something to migrate.
+    models.Base.metadata.create_all(bind=engine)
+
+    pending = [m for m in MIGRATIONS if m["version"] > current]
+    for migration in pending:
+        started = time.monotonic()
+        _apply(engine, migration)
+        print(
+            f"Applied migration {migration['version']} ({migration['name']}) "
+            f"in {time.monotonic() - started:.2f}s"
+        )
+    return len(pending)
+
+
+if __name__ == "__main__":
+    applied = run_migrations()
+    print(f"Migrations complete. Steps applied: {applied}")
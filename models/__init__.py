@@ -4,6 +4,10 @@ from models.account import Account
 from models.transaction import Transaction
 from models.stock import StockInstrument
 from models.idempotency import IdempotencyRecord
+from models.system_flag import SystemFlag
+from models.request_nonce import RequestNonce
+from models.migration_checkpoint import MigrationCheckpoint
+from models.schema_migration import SchemaMigration
 
 __all__ = [
     "User",
@@ -11,5 +15,9 @@ __all__ = [
     "Transaction",
     "StockInstrument",
     "IdempotencyRecord",
+    "SystemFlag",
+    "RequestNonce",
+    "MigrationCheckpoint",
+    "SchemaMigration",
     "Base",
 ]
@@ -14,6 +14,7 @@ class Account(Base):
         UUID(as_uuid=True),
         ForeignKey("users.user_id", ondelete="CASCADE"),
         nullable=False,
+        index=True,
     )
     bank_name = Column(String, nullable=False)
     account_number_masked = Column(String, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Integer, text
+from sqlalchemy import Column, String, DateTime, Integer, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 
@@ -7,6 +7,9 @@ from database import Base
 
 class IdempotencyRecord(Base):
     __tablename__ = "idempotency_records"
+    __table_args__ = (
+        Index("ix_idempotency_records_key_endpoint", "idempotency_key", "endpoint"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     idempotency_key = Column(String(128), nullable=False, unique=True, index=True)
@@ -15,7 +18,10 @@ class IdempotencyRecord(Base):
     response_status_code = Column(Integer, nullable=False)
     response_body = Column(String, nullable=False)
     created_at = Column(
-        DateTime(timezone=True), nullable=False, server_default=text("NOW()")
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=text("NOW()"),
+        index=True,
     )
 
     def __repr__(self):
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, String, DateTime, BigInteger, Boolean, text
+
+from database import Base
+
+
+class MigrationCheckpoint(Base):
+    __tablename__ = "migration_checkpoints"
+
+    name = Column(String(64), primary_key=True)
+    last_key = Column(String(64), nullable=True)
+    rows_scanned = Column(BigInteger, nullable=False, server_default=text("0"))
+    rows_updated = Column(BigInteger, nullable=False, server_default=text("0"))
+    completed = Column(Boolean, nullable=False, server_default=text("false"))
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=text("NOW()"),
+        onupdate=text("NOW()"),
+    )
+
+    def __repr__(self):
+        return f"<MigrationCheckpoint {self.name} at {self.last_key}>"
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, DateTime
+
+from database import Base
+
+
+class RequestNonce(Base):
+    __tablename__ = "request_nonces"
+
+    request_id_hash = Column(String(64), primary_key=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<RequestNonce {self.request_id_hash} until {self.expires_at}>"
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, Integer, String, text
+
+from database import Base
+
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(128), nullable=False)
+    applied_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=text("NOW()")
+    )
+
+    def __repr__(self):
+        return f"<SchemaMigration {self.version} {self.name}>"
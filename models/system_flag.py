@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, DateTime, Boolean, text
+
+from database import Base
+
+
+class SystemFlag(Base):
+    __tablename__ = "system_flags"
+
+    name = Column(String(64), primary_key=True)
+    enabled = Column(Boolean, nullable=False, server_default=text("false"))
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=text("NOW()"),
+        onupdate=text("NOW()"),
+    )
+
+    def __repr__(self):
+        return f"<SystemFlag {self.name}={self.enabled}>"
@@ -8,11 +8,13 @@ from sqlalchemy import (
     ForeignKey,
     text,
     CheckConstraint,
+    Index,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
 
+from config import TRANSACTIONS_PARTITIONED
 from database import Base
 
 
@@ -23,6 +25,28 @@ class Transaction(Base):
             "status IN ('BOOKED', 'PENDING', 'REJECTED')",
             name="ck_transactions_status_iso",
         ),
+        # Serves account history (account_id = ? AND date <= ? ORDER BY date DESC)
+        # without a sort; INCLUDE carries the response columns for index-only reads.
+        Index(
+            "ix_transactions_account_id_date",
+            "account_id",
+            text("date DESC"),
+            postgresql_include=[
+                "transaction_id",
+                "amount",
+                "currency",
+                "type",
+                "status",
+                "description",
+                "merchant",
+                "category",
+            ],
+        ),
+        (
+            {"postgresql_partition_by": "RANGE (date)"}
+            if TRANSACTIONS_PARTITIONED
+            else {}
+        ),
     )
 
     transaction_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -31,7 +55,10 @@ class Transaction(Base):
         ForeignKey("accounts.account_id", ondelete="CASCADE"),
         nullable=False,
     )
-    date = Column(DateTime(timezone=True), nullable=False)
+    # A partitioned table's primary key must include the partition key.
+    date = Column(
+        DateTime(timezone=True), nullable=False, primary_key=TRANSACTIONS_PARTITIONED
+    )
     amount = Column(Numeric(10, 2), nullable=False)
     currency = Column(String(3), nullable=False)
     type = Column(String(10), nullable=False)
@@ -53,5 +80,8 @@ class Transaction(Base):
 
     account = relationship("Account", back_populates="transactions")
 
+    # Rows are still identified by transaction_id alone, whatever the table PK.
+    __mapper_args__ = {"primary_key": [transaction_id]}
+
     def __repr__(self):
         return f"<Transaction {self.amount} {self.currency} - {self.type}>"
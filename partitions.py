@@ -0,0 +1,163 @@
+import asyncio
+from datetime import date, datetime, timezone
+
+from sqlalchemy import Engine, text
+
+from config import TRANSACTION_PARTITION_MONTHS_AHEAD, TRANSACTIONS_PARTITIONED
+from database import get_engine
+import models
+
+PARTITION_MAINTENANCE_INTERVAL_SECONDS = 24 * 60 * 60
+DEFAULT_PARTITION = "transactions_default"
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"transactions_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_ddl(month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF transactions "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') "
+        f"TO ('{add_months(month, 1):%Y-%m-%d} 00:00:00+00')"
+    )
+
+
+def _create_month_partition(conn, month: date) -> int:
+    """Create one monthly partition, moving its rows out of the default first.
+
+    Postgres refuses to create a partition whose range already has rows in the
+    default partition (future-dated persona data does), so the default is
+    detached, the month created and filled, and the default re-attached, all in
+    the caller's transaction. Returns the number of rows moved.
+    """
+    start = f"{month:%Y-%m-%d} 00:00:00+00"
+    end = f"{add_months(month, 1):%Y-%m-%d} 00:00:00+00"
+    in_month = f"date >= '{start}' AND date < '{end}'"
+    columns = ", ".join(models.Transaction.__table__.columns.keys())
+    if (
+        conn.execute(
+            text(f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_month} LIMIT 1")
+        ).first()
+        is not None
+    ):
+        conn.execute(
+            text(f"ALTER TABLE transactions DETACH PARTITION {DEFAULT_PARTITION}")
+        )
+        conn.execute(text(partition_ddl(month)))
+        moved = conn.execute(
+            text(
+                f"INSERT INTO {partition_name(month)} ({columns}) "
+                f"SELECT {columns} FROM {DEFAULT_PARTITION} WHERE {in_month}"
+            )
+        ).rowcount
+        conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_month}"))
+        conn.execute(
+            text(
+                f"ALTER TABLE transactions ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"
+            )
+        )
+        return moved
+    conn.execute(text(partition_ddl(month)))
+    return 0
+
+
+def transactions_is_partitioned(conn) -> bool:
+    return (
+        conn.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table p "
+                "JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = 'transactions'"
+            )
+        ).first()
+        is not None
+    )
+
+
+def ensure_transaction_partitions(
+    engine: Engine = None,
+    months_ahead: int = TRANSACTION_PARTITION_MONTHS_AHEAD,
+    since: date = None,
+) -> list:
+    """Create the default partition and any missing monthly partitions.
+
+    Covers the month of `since` (default: the current month) through
+    `months_ahead` months later and returns the names that were created.
+    Existing partitions are looked up first so the parent is only locked when
+    something is actually missing.
+    """
+    engine = engine or get_engine()
+    if not TRANSACTIONS_PARTITIONED or engine.dialect.name != "postgresql":
+        return []
+
+    first = month_start(since or datetime.now(timezone.utc))
+    months = [add_months(first, offset) for offset in range(months_ahead + 1)]
+
+    with engine.begin() as conn:
+        if not transactions_is_partitioned(conn):
+            print(
+                "WARNING: TRANSACTIONS_PARTITIONED is set but the transactions table "
+                "is not partitioned; existing tables are not converted in place."
+            )
+            return []
+        existing = set(
+            conn.execute(
+                text(
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = 'transactions'::regclass"
+                )
+            ).scalars()
+        )
+
+    created = []
+    if DEFAULT_PARTITION not in existing:
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} "
+                    "PARTITION OF transactions DEFAULT"
+                )
+            )
+        created.append(DEFAULT_PARTITION)
+        print(f"Created transactions partition {DEFAULT_PARTITION}")
+
+    # One transaction per month: a month that cannot be created is reported
+    # and retried on the next run without blocking the others or startup.
+    for month in months:
+        name = partition_name(month)
+        if name in existing:
+            continue
+        try:
+            with engine.begin() as conn:
+                moved = _create_month_partition(conn, month)
+        except Exception as e:
+            print(f"WARNING: could not create transactions partition {name}: {e}")
+            continue
+        created.append(name)
+        suffix = f" ({moved} rows moved from {DEFAULT_PARTITION})" if moved else ""
+        print(f"Created transactions partition {name}{suffix}")
+    return created
+
+
+async def maintain_transaction_partitions(
+    interval: float = PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+) -> None:
+    # Keeps future months provisioned for long-running processes; safe to run
+    # from every worker since existing partitions are skipped.
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(ensure_transaction_partitions)
+        except Exception as e:
+            print(f"Transaction partition maintenance failed: {e}")
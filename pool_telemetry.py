@@ -0,0 +1,86 @@
+import bisect
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Upper bounds (milliseconds) of the checkout wait-time histogram buckets.
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class PoolWaitStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bucket_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self._checkouts = 0
+        self._timeouts = 0
+        self._total_wait_ms = 0.0
+        self._max_wait_ms = 0.0
+
+    def observe(self, wait_ms: float, timed_out: bool = False) -> None:
+        bucket = bisect.bisect_left(WAIT_BUCKETS_MS, wait_ms)
+        with self._lock:
+            self._bucket_counts[bucket] += 1
+            self._checkouts += 1
+            self._timeouts += int(timed_out)
+            self._total_wait_ms += wait_ms
+            self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"le_{bound}ms" for bound in WAIT_BUCKETS_MS] + ["gt_5000ms"]
+            return {
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "avg_wait_ms": (
+                    round(self._total_wait_ms / self._checkouts, 3)
+                    if self._checkouts
+                    else 0.0
+                ),
+                "max_wait_ms": round(self._max_wait_ms, 3),
+                "wait_histogram": dict(zip(labels, self._bucket_counts)),
+            }
+
+
+class _WaitTimingMixin:
+    # _do_get is where a QueuePool blocks for a free connection, so timing it
+    # measures exactly the queueing that shows up as slow requests under load.
+    wait_stats: PoolWaitStats
+
+    def _do_get(self):
+        if not hasattr(self, "wait_stats"):
+            self.wait_stats = PoolWaitStats()
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.observe(
+                (time.perf_counter() - started) * 1000, timed_out=True
+            )
+            raise
+        self.wait_stats.observe((time.perf_counter() - started) * 1000)
+        return connection
+
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_status(pool) -> dict:
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            timeout_seconds=pool.timeout(),
+        )
+    wait_stats = getattr(pool, "wait_stats", None)
+    status.update(wait_stats.snapshot() if wait_stats else PoolWaitStats().snapshot())
+    return status
@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from config import (
+    DATABASE_REPLICA_URLS,
+    REPLICA_LAG_CHECK_SECONDS,
+    REPLICA_MAX_LAG_SECONDS,
+    REPLICA_SELECTION,
+)
+from database import (
+    AsyncSessionLocal,
+    build_async_database_url,
+    pool_options,
+)
+from pool_telemetry import InstrumentedAsyncQueuePool, pool_status
+
+# Seconds since the last replayed transaction, or 0 when the replica has
+# replayed everything it received (an idle primary is not lag). A replica whose
+# WAL receiver is not streaming reports NULL: it has replayed all it received,
+# but that says nothing about how far behind the primary it is. A server that
+# is not in recovery (e.g. a second local Postgres) reports 0.
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN NOT EXISTS ("
+    "SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming'"
+    ") THEN NULL "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END"
+)
+
+
+class ReplicaRouter:
+    """Picks a replica engine for read-only sessions, skipping lagging ones."""
+
+    def __init__(self, urls, strategy: str, max_lag_seconds: float):
+        if strategy not in ("round_robin", "least_connections"):
+            raise ValueError(
+                "REPLICA_SELECTION must be 'round_robin' or 'least_connections', "
+                f"got {strategy!r}"
+            )
+        self._urls = [build_async_database_url(url) for url in urls]
+        self._strategy = strategy
+        self._max_lag = max_lag_seconds
+        self._engines = None
+        # Unknown until the first lag check; unknown replicas are not used.
+        self._lag = {}
+        self._turn = itertools.count()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._urls)
+
+    def engines(self):
+        if self._engines is None:
+            self._engines = [
+                create_async_engine(
+                    url, **pool_options(url, InstrumentedAsyncQueuePool)
+                )
+                for url in self._urls
+            ]
+        return self._engines
+
+    def _healthy(self):
+        return [
+            engine
+            for engine in self.engines()
+            if self._lag.get(engine) is not None and self._lag[engine] <= self._max_lag
+        ]
+
+    def pick(self):
+        candidates = self._healthy()
+        if not candidates:
+            return None
+        if self._strategy == "least_connections":
+            return min(
+                candidates,
+                key=lambda engine: getattr(
+                    engine.sync_engine.pool, "checkedout", lambda: 0
+                )(),
+            )
+        return candidates[next(self._turn) % len(candidates)]
+
+    async def check_lag(self) -> None:
+        for engine in self.engines():
+            was_healthy = engine in self._healthy()
+            try:
+                async with engine.connect() as conn:
+                    lag = (await conn.execute(REPLICA_LAG_QUERY)).scalar_one()
+                if lag is None:
+                    error = "WAL receiver not streaming"
+                else:
+                    lag = float(lag)
+            except Exception as e:
+                lag = None
+                error = e
+            self._lag[engine] = lag
+            if was_healthy and engine not in self._healthy():
+                reason = f"lag {lag:.1f}s" if lag is not None else f"error: {error}"
+                print(
+                    f"Replica {engine.url.render_as_string()} removed from "
+                    f"rotation ({reason})"
+                )
+
+    async def monitor(self, interval: float = REPLICA_LAG_CHECK_SECONDS) -> None:
+        while True:
+            await self.check_lag()
+            await asyncio.sleep(interval)
+
+    def status(self):
+        return [
+            {
+                "url": engine.url.render_as_string(),
+                "lag_seconds": self._lag.get(engine),
+                "in_rotation": engine in self._healthy(),
+                **pool_status(engine.sync_engine.pool),
+            }
+            for engine in (self.engines() if self.enabled else [])
+        ]
+
+    async def dispose(self) -> None:
+        for engine in self._engines or []:
+            await engine.dispose()
+
+
+replica_router = ReplicaRouter(
+    DATABASE_REPLICA_URLS, REPLICA_SELECTION, REPLICA_MAX_LAG_SECONDS
+)
+
+
+def read_session():
+    """Session on a healthy replica, or on the primary when none qualifies."""
+    engine = replica_router.pick() if replica_router.enabled else None
+    if engine is None:
+        return AsyncSessionLocal()
+    return AsyncSessionLocal(bind=engine)
+
+
+async def get_read_db():
+    # For read-only handlers only. Writes, idempotency lookups and anything
+    # that must see the caller's own just-committed writes use get_async_db.
+    async with read_session() as db:
+        yield db
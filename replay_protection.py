@@ -0,0 +1,113 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+import models
+from config import (
+    SIGNED_REQUEST_MAX_SKEW_SECONDS,
+    SIGNED_REQUEST_NONCE_BACKEND,
+    SIGNED_REQUEST_NONCE_MAX_ENTRIES,
+    SIGNED_REQUEST_NONCE_SWEEP_SECONDS,
+    SIGNED_REQUEST_NONCE_TTL_SECONDS,
+)
+from database import AsyncSessionLocal
+
+
+def _nonce_key(request_id: str) -> str:
+    # Request IDs are client supplied; hashing bounds the stored key size.
+    return hashlib.sha256(request_id.encode("utf-8")).hexdigest()
+
+
+class NonceStoreFullError(Exception):
+    """Every slot holds a live nonce; evicting one would allow its replay."""
+
+
+class InMemoryNonceStore:
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        # nonce key -> expiry. Every nonce gets the same TTL, so insertion order
+        # is expiry order and expired entries are always at the front.
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def claim(self, request_id: str) -> bool:
+        key = _nonce_key(request_id)
+        now = time.monotonic()
+        with self._lock:
+            while self._seen:
+                oldest_key, expires_at = next(iter(self._seen.items()))
+                if expires_at > now:
+                    break
+                del self._seen[oldest_key]
+            if key in self._seen:
+                return False
+            # Fail closed: only expired nonces are ever dropped.
+            if len(self._seen) >= self._max_entries:
+                raise NonceStoreFullError()
+            self._seen[key] = now + self._ttl
+        return True
+
+
+class PostgresNonceStore:
+    """Shares seen request IDs across workers through the request_nonces table."""
+
+    def __init__(self, ttl_seconds: int, sweep_interval_seconds: int):
+        self._ttl = timedelta(seconds=ttl_seconds)
+        self._sweep_interval = sweep_interval_seconds
+        self._last_sweep = time.monotonic()
+
+    async def claim(self, request_id: str) -> bool:
+        now = datetime.now(timezone.utc)
+        table = models.RequestNonce.__table__
+        statement = pg_insert(table).values(
+            request_id_hash=_nonce_key(request_id), expires_at=now + self._ttl
+        )
+        # An expired row is reclaimed in place so the sweeper is never on the
+        # critical path for correctness.
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.request_id_hash],
+            set_={"expires_at": statement.excluded.expires_at},
+            where=table.c.expires_at <= now,
+        ).returning(table.c.request_id_hash)
+
+        async with AsyncSessionLocal() as db:
+            claimed = (await db.execute(statement)).first() is not None
+            if time.monotonic() - self._last_sweep >= self._sweep_interval:
+                self._last_sweep = time.monotonic()
+                await db.execute(delete(table).where(table.c.expires_at <= now))
+            await db.commit()
+        return claimed
+
+
+def build_nonce_store():
+    # A request signed at the edge of the window can be replayed until the other
+    # edge, so its ID must be remembered for the whole window.
+    if SIGNED_REQUEST_NONCE_TTL_SECONDS < 2 * SIGNED_REQUEST_MAX_SKEW_SECONDS:
+        raise ValueError(
+            "SIGNED_REQUEST_NONCE_TTL_SECONDS must be at least "
+            "2 * SIGNED_REQUEST_MAX_SKEW_SECONDS, "
+            f"got {SIGNED_REQUEST_NONCE_TTL_SECONDS}"
+        )
+    if SIGNED_REQUEST_NONCE_BACKEND == "postgres":
+        return PostgresNonceStore(
+            ttl_seconds=SIGNED_REQUEST_NONCE_TTL_SECONDS,
+            sweep_interval_seconds=SIGNED_REQUEST_NONCE_SWEEP_SECONDS,
+        )
+    if SIGNED_REQUEST_NONCE_BACKEND == "memory":
+        return InMemoryNonceStore(
+            ttl_seconds=SIGNED_REQUEST_NONCE_TTL_SECONDS,
+            max_entries=SIGNED_REQUEST_NONCE_MAX_ENTRIES,
+        )
+    raise ValueError(
+        "SIGNED_REQUEST_NONCE_BACKEND must be 'memory' or 'postgres', "
+        f"got {SIGNED_REQUEST_NONCE_BACKEND!r}"
+    )
+
+
+nonce_store = build_nonce_store()
@@ -1,5 +1,10 @@
 from schemas.auth import Token, TokenData, LoginResponse
-from schemas.transaction import TransactionBase, TransactionCreate, Transaction
+from schemas.transaction import (
+    TransactionBase,
+    TransactionCreate,
+    Transaction,
+    TransactionPage,
+)
 from schemas.stock import (
     StockInstrumentBase,
     StockInstrumentCreate,
@@ -20,6 +25,7 @@ __all__ = [
     "TransactionBase",
     "TransactionCreate",
     "Transaction",
+    "TransactionPage",
     "StockInstrumentBase",
     "StockInstrumentCreate",
     "StockInstrument",
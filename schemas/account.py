@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
 from schemas.transaction import Transaction
@@ -26,6 +26,7 @@ class Account(AccountBase):
 
 class AccountWithTransactions(Account):
     transactions: List[Transaction] = Field(default_factory=list)
+    next_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
 
@@ -26,3 +26,8 @@ class Transaction(TransactionBase):
 
     class Config:
         from_attributes = True
+
+
+class TransactionPage(BaseModel):
+    transactions: List[Transaction] = Field(default_factory=list)
+    next_cursor: Optional[str] = None
@@ -1,22 +1,42 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Iterable, List
+from typing import FrozenSet, Optional, Iterable, List, Tuple
+import asyncio
 import hashlib
 import hmac
 import json
 import os
+import threading
+import time
 import uuid
 
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 import models
 import schemas
-from database import get_db
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from database import get_async_db
+from config import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    PASSWORD_HASH_MAX_WORKERS,
+    PASSWORD_HASH_QUEUE_LIMIT,
+    PRINCIPAL_CACHE_MAX_ENTRIES,
+    PRINCIPAL_CACHE_TTL_SECONDS,
+    TOKEN_CACHE_MAX_ENTRIES,
+    SIGNED_REQUEST_MAX_SKEW_SECONDS,
+)
 from encryption_service import encrypt, decrypt, stable_hash, mask_account_number
+from replay_protection import NonceStoreFullError, nonce_store
+from services.common import find_user_by_phonenumber
+from ttl_cache import TTLCache
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(
@@ -29,6 +49,52 @@ oauth2_scheme = OAuth2PasswordBearer(
     },
 )
 
+# Keyed by a SHA-256 digest of the bearer token so raw tokens never sit in memory
+# longer than the request; values are (TokenData, token scopes).
+_token_claims_cache = TTLCache(max_entries=TOKEN_CACHE_MAX_ENTRIES)
+_principal_cache = TTLCache(
+    max_entries=PRINCIPAL_CACHE_MAX_ENTRIES, default_ttl=PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+
+@dataclass(frozen=True)
+class AuthenticatedPrincipal:
+    """Detached snapshot of the caller, safe to share across requests.
+
+    Mirrors the User columns read by role checks and build_user_response so
+    endpoints can use it wherever they previously used the ORM user.
+    """
+
+    user_id: uuid.UUID
+    username: str
+    role: str
+    full_name: str
+    created_at: datetime
+    phonenumber: Optional[str]
+    phonenumber_encrypted: Optional[str]
+    email_encrypted: Optional[str]
+    accounts: Tuple[schemas.Account, ...]
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "AuthenticatedPrincipal":
+        return cls(
+            user_id=user.user_id,
+            username=user.username,
+            role=user.role or "customer",
+            full_name=user.full_name,
+            created_at=user.created_at,
+            phonenumber=user.phonenumber,
+            phonenumber_encrypted=user.phonenumber_encrypted,
+            email_encrypted=user.email_encrypted,
+            accounts=tuple(
+                schemas.Account.model_validate(account) for account in user.accounts
+            ),
+        )
+
+
+def invalidate_principal(user_id) -> None:
+    _principal_cache.pop(str(user_id))
+
 
 def build_scope_claim(scopes: Optional[Iterable[str]]) -> str:
     if not scopes:
@@ -51,6 +117,40 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+_password_hash_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_MAX_WORKERS, thread_name_prefix="password-hash"
+)
+_password_hash_slots = threading.BoundedSemaphore(
+    PASSWORD_HASH_MAX_WORKERS + PASSWORD_HASH_QUEUE_LIMIT
+)
+
+
+def _submit_password_task(fn, *args) -> Future:
+    if not _password_hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        future = _password_hash_executor.submit(fn, *args)
+    except BaseException:
+        _password_hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _password_hash_slots.release())
+    return future
+
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await asyncio.wrap_future(
+        _submit_password_task(verify_password, plain_password, hashed_password)
+    )
+
+
+async def get_password_hash_async(password) -> str:
+    return await asyncio.wrap_future(_submit_password_task(get_password_hash, password))
+
+
 def create_access_token(
     user_id: str,
     expires_delta: Optional[timedelta] = None,
@@ -73,10 +173,34 @@ def create_access_token(
     return encoded_jwt
 
 
+def decode_token_claims(token: str) -> Tuple[schemas.TokenData, FrozenSet[str]]:
+    token_digest = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    cached = _token_claims_cache.get(token_digest)
+    if cached is not None:
+        return cached
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    subject = payload.get("sub")
+    if subject is None:
+        raise JWTError("Token is missing the sub claim")
+
+    claims = (
+        schemas.TokenData(user_id=subject, roles=payload.get("roles", [])),
+        frozenset(payload.get("scope", "").split()),
+    )
+
+    # jwt.decode already rejected expired tokens; cache only until the token's
+    # own expiry so a cached entry can never outlive the token itself.
+    expires_at = payload.get("exp")
+    if expires_at is not None:
+        _token_claims_cache.set(token_digest, claims, ttl=expires_at - time.time())
+    return claims
+
+
 async def get_current_user(
     security_scopes: SecurityScopes,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if security_scopes.scopes:
         authenticate_value = f'Bearer scope="{security_scopes.scope_str}"'
@@ -89,51 +213,52 @@ async def get_current_user(
         headers={"WWW-Authenticate": authenticate_value},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        subject: str = payload.get("sub")
-        if subject is None:
-            raise credentials_exception
-
-        token_scope_str = payload.get("scope", "")
-        token_scopes = token_scope_str.split()
-        for required_scope in security_scopes.scopes:
-            if required_scope not in token_scopes:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Not enough permissions",
-                    headers={"WWW-Authenticate": authenticate_value},
-                )
-
-        token_data = schemas.TokenData(user_id=subject, roles=payload.get("roles", []))
+        token_data, token_scopes = decode_token_claims(token)
     except JWTError:
         raise credentials_exception
 
-    user = None
+    for required_scope in security_scopes.scopes:
+        if required_scope not in token_scopes:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not enough permissions",
+                headers={"WWW-Authenticate": authenticate_value},
+            )
+
+    principal = None
     if token_data.user_id:
         try:
             parsed_id = uuid.UUID(token_data.user_id)
-            user = (
-                db.query(models.User).filter(models.User.user_id == parsed_id).first()
-            )
         except ValueError:
             # Backward compatibility with legacy tokens where sub used phone number.
-            phone_hash = stable_hash(token_data.user_id)
-            user = (
-                db.query(models.User)
-                .filter(
-                    (models.User.phonenumber_hash == phone_hash)
-                    | (models.User.phonenumber == token_data.user_id)
-                )
-                .first()
+            # These are rare and keyed by phone, so they bypass the principal cache.
+            user = await find_user_by_phonenumber(
+                db, token_data.user_id, selectinload(models.User.accounts)
             )
+            if user is not None:
+                principal = AuthenticatedPrincipal.from_user(user)
+        else:
+            principal = _principal_cache.get(str(parsed_id))
+            if principal is None:
+                result = await db.execute(
+                    select(models.User)
+                    .options(selectinload(models.User.accounts))
+                    .where(models.User.user_id == parsed_id)
+                )
+                user = result.scalars().first()
+                if user is not None:
+                    principal = AuthenticatedPrincipal.from_user(user)
+                    _principal_cache.set(str(parsed_id), principal)
 
-    if user is None:
+    if principal is None:
         raise credentials_exception
-    return user
+    return principal
 
 
 def require_roles(required_roles: List[str]):
-    async def _role_checker(current_user: models.User = Depends(get_current_user)):
+    async def _role_checker(
+        current_user: AuthenticatedPrincipal = Depends(get_current_user),
+    ):
         # Sandbox default: if role field is unavailable, treat user as customer.
         role = getattr(current_user, "role", "customer")
         if role not in required_roles:
@@ -149,11 +274,14 @@ def require_roles(required_roles: List[str]):
 def verify_request_signature(
     raw_body: bytes,
     request_id: str,
+    timestamp: str,
     signature: str,
     secret: Optional[str] = None,
 ) -> None:
     signing_secret = secret or os.getenv("BANK_SIGNING_SECRET") or SECRET_KEY
-    message = request_id.encode("utf-8") + b"." + raw_body
+    message = (
+        request_id.encode("utf-8") + b"." + timestamp.encode("utf-8") + b"." + raw_body
+    )
     expected = hmac.new(
         signing_secret.encode("utf-8"), message, hashlib.sha256
     ).hexdigest()
@@ -167,6 +295,7 @@ def verify_request_signature(
 
 async def require_signed_request(request: Request) -> None:
     request_id = request.headers.get("X-Request-ID")
+    timestamp = request.headers.get("X-Request-Timestamp")
     signature = request.headers.get("X-Bank-Signature")
 
     if not request_id:
@@ -174,6 +303,18 @@ async def require_signed_request(request: Request) -> None:
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Missing X-Request-ID header",
         )
+    if not timestamp:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Missing X-Request-Timestamp header",
+        )
+    try:
+        signed_at = int(timestamp)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="X-Request-Timestamp must be a Unix time in seconds",
+        )
     if not signature:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -182,10 +323,48 @@ async def require_signed_request(request: Request) -> None:
 
     raw_body = await request.body()
     verify_request_signature(
-        raw_body=raw_body, request_id=request_id, signature=signature
+        raw_body=raw_body,
+        request_id=request_id,
+        timestamp=timestamp,
+        signature=signature,
     )
+    # Outside the window the nonce store may already have forgotten the ID.
+    if abs(time.time() - signed_at) > SIGNED_REQUEST_MAX_SKEW_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="X-Request-Timestamp is outside the allowed window",
+        )
+
+    # Only claim the ID after the signature checks out, so unsigned junk cannot
+    # burn request IDs that a legitimate client is about to use.
+    try:
+        claimed = await nonce_store.claim(request_id)
+    except NonceStoreFullError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Replay protection is at capacity, please retry",
+            headers={"Retry-After": "1"},
+        )
+    if not claimed:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="X-Request-ID has already been used; signed requests cannot be replayed",
+        )
 
 
 def hash_idempotency_payload(payload: dict) -> str:
     canonical_payload = json.dumps(payload, sort_keys=True, separators=(",", ":"))
     return hashlib.sha256(canonical_payload.encode("utf-8")).hexdigest()
+
+
+def ensure_owned(row, *, not_found: str, forbidden: str):
+    """Map an ownership-scoped read (see services.read_models.owned_by) to 404/403.
+
+    A missing row or a NULL flag means the resource does not exist.
+    """
+    owned = None if row is None else row.owned
+    if owned is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=not_found)
+    if not owned:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=forbidden)
+    return row
@@ -0,0 +1,37 @@
+import argparse
+import time
+
+from sqlalchemy import func, select
+
+from database import SessionLocal
+from services import seed_stock_instruments
+
+# Distinct from the startup leader lock so seeding never blocks a deploy.
+STOCK_SEED_ADVISORY_LOCK_ID = 0x4B4F5353
+
+
+def run_stock_seed() -> int:
+    started = time.monotonic()
+    with SessionLocal() as db:
+        if db.get_bind().dialect.name == "postgresql":
+            # Released at commit; a concurrent caller (the CLI next to a
+            # running app) skips instead of repeating the same INSERT.
+            acquired = db.execute(
+                select(func.pg_try_advisory_xact_lock(STOCK_SEED_ADVISORY_LOCK_ID))
+            ).scalar_one()
+            if not acquired:
+                print("Stock seeding already running in another process; skipped.")
+                return 0
+        inserted = seed_stock_instruments(db)
+    print(
+        f"Stock instruments seeded: {inserted} holdings inserted "
+        f"in {time.monotonic() - started:.2f}s"
+    )
+    return inserted
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(
+        description="Give every user the NEPSE demo stock holdings (idempotent)."
+    ).parse_args()
+    run_stock_seed()
@@ -1,21 +1,61 @@
 from services.common import (
     MARKET_DUMMY_STOCKS,
+    PHONE_HASH_BACKFILL_FLAG,
+    find_user_by_phonenumber,
     get_today_utc_end,
-    get_visible_transactions_query,
+    encode_transaction_cursor,
+    decode_transaction_cursor,
     build_user_response,
     build_transaction_response,
     build_transaction_list_response,
-    get_masked_account_number,
+    build_transaction_row,
+    build_transaction_rows,
+    get_or_persist_masked_account_number,
+    purge_user_pii,
+    purge_account_pii,
+    clear_pii_cache,
     seed_stock_instruments,
 )
+from services.read_models import (
+    TRANSACTION_COLUMNS,
+    ACCOUNT_COLUMNS,
+    STOCK_INSTRUMENT_COLUMNS,
+    select_transaction_rows,
+    select_account_history_rows,
+    owned_by,
+    fetch_owned_transaction_page,
+    get_owned_transaction_row,
+    get_owned_account_row,
+    list_account_rows,
+    list_stock_instrument_rows,
+)
 
 __all__ = [
     "MARKET_DUMMY_STOCKS",
+    "PHONE_HASH_BACKFILL_FLAG",
+    "find_user_by_phonenumber",
     "get_today_utc_end",
-    "get_visible_transactions_query",
+    "encode_transaction_cursor",
+    "decode_transaction_cursor",
+    "fetch_owned_transaction_page",
     "build_user_response",
     "build_transaction_response",
     "build_transaction_list_response",
-    "get_masked_account_number",
+    "build_transaction_row",
+    "build_transaction_rows",
+    "get_or_persist_masked_account_number",
+    "purge_user_pii",
+    "purge_account_pii",
+    "clear_pii_cache",
     "seed_stock_instruments",
+    "TRANSACTION_COLUMNS",
+    "ACCOUNT_COLUMNS",
+    "STOCK_INSTRUMENT_COLUMNS",
+    "select_transaction_rows",
+    "select_account_history_rows",
+    "owned_by",
+    "get_owned_transaction_row",
+    "get_owned_account_row",
+    "list_account_rows",
+    "list_stock_instrument_rows",
 ]
@@ -1,12 +1,39 @@
+import base64
+import hashlib
+import time
 from datetime import datetime, timezone
 from decimal import Decimal
-from typing import List
-
+from typing import List, Optional
+from uuid import UUID
+
+from sqlalchemy import (
+    Integer,
+    Numeric,
+    String,
+    cast,
+    column,
+    delete,
+    func,
+    select,
+    union_all,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from encryption_service import decrypt, looks_encrypted, mask_account_number
+from config import PII_CACHE_MAX_ENTRIES, PII_CACHE_TTL_SECONDS
+from database import AsyncSessionLocal
+from encryption_service import (
+    decrypt,
+    looks_encrypted,
+    mask_account_number,
+    stable_hash,
+)
 import models
 import schemas
+from ttl_cache import TTLCache
 
 
 MARKET_DUMMY_STOCKS = [
@@ -49,15 +76,81 @@ MARKET_DUMMY_STOCKS = [
 ]
 
 
+# Set by migrate_encrypt_legacy_data.py once every user with a phone number also
+# has phonenumber_hash, after which phone lookups no longer need the plaintext column.
+PHONE_HASH_BACKFILL_FLAG = "phone_hash_backfill_complete"
+PHONE_LOOKUP_FLAG_RECHECK_SECONDS = 60
+
+_phone_lookup_state = {"hash_only": False, "checked_at": None}
+
+# (column, row id) -> (ciphertext digest, plaintext). A digest mismatch means the
+# row was re-encrypted or changed, and the stale plaintext is never returned.
+_pii_cache = TTLCache(
+    max_entries=PII_CACHE_MAX_ENTRIES, default_ttl=PII_CACHE_TTL_SECONDS
+)
+
+
 def get_today_utc_end() -> datetime:
     now_utc = datetime.now(timezone.utc)
     return now_utc.replace(hour=23, minute=59, second=59, microsecond=999999)
 
 
-def get_visible_transactions_query(db: Session):
-    return db.query(models.Transaction).filter(
-        models.Transaction.date <= get_today_utc_end()
+async def _phone_lookup_is_hash_only(db: AsyncSession) -> bool:
+    # The flag only ever flips from false to true, so once seen it is kept for
+    # the life of the process; until then it is re-read at most once a minute.
+    if _phone_lookup_state["hash_only"]:
+        return True
+    checked_at = _phone_lookup_state["checked_at"]
+    now = time.monotonic()
+    if checked_at is not None and now - checked_at < PHONE_LOOKUP_FLAG_RECHECK_SECONDS:
+        return False
+
+    result = await db.execute(
+        select(models.SystemFlag.enabled).where(
+            models.SystemFlag.name == PHONE_HASH_BACKFILL_FLAG
+        )
+    )
+    _phone_lookup_state["hash_only"] = bool(result.scalar())
+    _phone_lookup_state["checked_at"] = now
+    return _phone_lookup_state["hash_only"]
+
+
+async def find_user_by_phonenumber(
+    db: AsyncSession, phonenumber: str, *options
+) -> Optional[models.User]:
+    by_hash = select(models.User).where(
+        models.User.phonenumber_hash == stable_hash(phonenumber)
     )
+    if await _phone_lookup_is_hash_only(db):
+        statement = by_hash.options(*options).limit(1)
+    else:
+        # Two single-index probes; an OR across both columns tends to become a
+        # BitmapOr or a sequential scan on Postgres.
+        by_plaintext = select(models.User).where(models.User.phonenumber == phonenumber)
+        statement = (
+            select(models.User)
+            .options(*options)
+            .from_statement(union_all(by_hash, by_plaintext).limit(1))
+        )
+
+    result = await db.execute(statement)
+    return result.scalars().first()
+
+
+def encode_transaction_cursor(transaction: models.Transaction) -> str:
+    raw = f"{transaction.date.isoformat()}|{transaction.transaction_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_transaction_cursor(cursor: str):
+    """Return (date, transaction_id) from an opaque cursor or raise ValueError."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        date_part, id_part = raw.split("|", 1)
+        return datetime.fromisoformat(date_part), UUID(id_part)
+    except (ValueError, UnicodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
 
 
 def _to_utc_date(value: datetime):
@@ -68,12 +161,40 @@ def _to_utc_date(value: datetime):
     return value.date()
 
 
+def _decrypt_cached(column: str, row_id, ciphertext: str, aad: str) -> str:
+    cache_key = (column, str(row_id))
+    digest = hashlib.blake2b(ciphertext.encode("utf-8"), digest_size=16).digest()
+    cached = _pii_cache.get(cache_key)
+    if cached is not None and cached[0] == digest:
+        return cached[1]
+
+    plaintext = decrypt(ciphertext, aad=aad)
+    _pii_cache.set(cache_key, (digest, plaintext))
+    return plaintext
+
+
+def purge_user_pii(user_id) -> None:
+    _pii_cache.pop(("user_phone", str(user_id)))
+    _pii_cache.pop(("user_email", str(user_id)))
+
+
+def purge_account_pii(account_id) -> None:
+    _pii_cache.pop(("account_number", str(account_id)))
+
+
+def clear_pii_cache() -> None:
+    _pii_cache.clear()
+
+
 def _extract_user_phone(user: models.User):
     if user.phonenumber_encrypted:
         try:
             if looks_encrypted(user.phonenumber_encrypted):
-                return decrypt(
-                    user.phonenumber_encrypted, aad=f"user_phone:{user.user_id}"
+                return _decrypt_cached(
+                    "user_phone",
+                    user.user_id,
+                    user.phonenumber_encrypted,
+                    aad=f"user_phone:{user.user_id}",
                 )
         except Exception:
             return None
@@ -84,7 +205,12 @@ def _extract_user_email(user: models.User):
     if user.email_encrypted:
         try:
             if looks_encrypted(user.email_encrypted):
-                return decrypt(user.email_encrypted, aad=f"user_email:{user.user_id}")
+                return _decrypt_cached(
+                    "user_email",
+                    user.user_id,
+                    user.email_encrypted,
+                    aad=f"user_email:{user.user_id}",
+                )
         except Exception:
             return None
     return None
@@ -102,21 +228,46 @@ def build_user_response(user: models.User) -> schemas.User:
     )
 
 
-def get_masked_account_number(account: models.Account) -> str:
-    if account.account_number_masked:
-        return account.account_number_masked
+def _derive_masked_account_number(account: models.Account) -> Optional[str]:
     if account.account_number_encrypted and looks_encrypted(
         account.account_number_encrypted
     ):
         try:
-            plain = decrypt(
+            plain = _decrypt_cached(
+                "account_number",
+                account.account_id,
                 account.account_number_encrypted,
                 aad=f"account_number:{account.account_id}",
             )
             return mask_account_number(plain)
         except Exception:
             pass
-    return "****"
+    return None
+
+
+async def get_or_persist_masked_account_number(account: models.Account) -> str:
+    if account.account_number_masked:
+        return account.account_number_masked
+
+    masked = _derive_masked_account_number(account)
+    if masked is None:
+        return "****"
+
+    # Written through its own short session so read-only request sessions stay
+    # read-only; the next read takes the stored mask and skips decryption.
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(models.Account)
+            .where(
+                models.Account.account_id == account.account_id,
+                models.Account.account_number_encrypted
+                == account.account_number_encrypted,
+            )
+            .values(account_number_masked=masked)
+        )
+        await db.commit()
+    purge_account_pii(account.account_id)
+    return masked
 
 
 def build_transaction_response(
@@ -142,51 +293,124 @@ def build_transaction_list_response(transactions: List[models.Transaction]):
     return [build_transaction_response(tx, today_date) for tx in transactions]
 
 
-def seed_stock_instruments(db: Session):
-    users = db.query(models.User).all()
-    if not users:
-        return
+def build_transaction_row(row, latest_visible_date) -> dict:
+    return {
+        "account_id": row.account_id,
+        "date": row.date,
+        "amount": float(row.amount),
+        "currency": row.currency,
+        "type": row.type,
+        "status": row.status,
+        "description": row.description,
+        "merchant": row.merchant,
+        "category": row.category,
+        "transaction_id": row.transaction_id,
+        "is_new": _to_utc_date(row.date) == latest_visible_date,
+    }
+
+
+def build_transaction_rows(rows) -> List[dict]:
+    """Plain dicts shaped like schemas.Transaction, built without validation.
+
+    For the large list endpoints: the values come straight from typed database
+    columns, so re-checking them through pydantic only costs time.
+    """
+    today_date = datetime.now(timezone.utc).date()
+    return [build_transaction_row(row, today_date) for row in rows]
+
 
+def _stock_seed_rows():
+    # Slot n is the rotation the original per-user loop gave the n-th user: four
+    # NEPSE stocks starting at offset n, with fixed quantity/price templates.
     quantity_templates = ["3.500000", "7.000000", "1.250000", "4.000000"]
     buy_multipliers = ["0.87", "0.93", "1.05", "1.12"]
-    nepse_symbols = {stock["symbol"] for stock in MARKET_DUMMY_STOCKS}
-
-    for user_index, user in enumerate(users):
-        user_id_str = str(user.user_id)
+    rows = []
+    for slot in range(len(MARKET_DUMMY_STOCKS)):
+        assigned = (MARKET_DUMMY_STOCKS[slot:] + MARKET_DUMMY_STOCKS[:slot])[:4]
+        for stock_index, stock in enumerate(assigned):
+            current_price = Decimal(stock["current_price"])
+            rows.append(
+                (
+                    slot,
+                    stock["symbol"],
+                    stock["name"],
+                    Decimal(quantity_templates[stock_index]),
+                    current_price * Decimal(buy_multipliers[stock_index]),
+                    current_price,
+                    stock["currency"],
+                )
+            )
+    return rows
 
-        db.query(models.StockInstrument).filter(
-            models.StockInstrument.user_id == user_id_str,
-            ~models.StockInstrument.symbol.in_(nepse_symbols),
-        ).delete(synchronize_session=False)
 
-        existing_symbols = {
-            row.symbol
-            for row in db.query(models.StockInstrument.symbol)
-            .filter(models.StockInstrument.user_id == user_id_str)
-            .all()
-        }
+def seed_stock_instruments(db: Session) -> int:
+    """Give every user their NEPSE demo holdings in two set-based statements.
 
-        offset = user_index % len(MARKET_DUMMY_STOCKS)
-        assigned = (MARKET_DUMMY_STOCKS[offset:] + MARKET_DUMMY_STOCKS[:offset])[:4]
+    Returns the number of holdings inserted. Existing (user_id, symbol) rows are
+    left untouched, so the routine is safe to re-run and to run concurrently.
+    """
+    nepse_symbols = [stock["symbol"] for stock in MARKET_DUMMY_STOCKS]
+    holding = models.StockInstrument
+    user_ids = select(cast(models.User.user_id, String))
 
-        for stock_index, stock in enumerate(assigned):
-            if stock["symbol"] in existing_symbols:
-                continue
+    db.execute(
+        delete(holding)
+        .where(holding.user_id.in_(user_ids), holding.symbol.not_in(nepse_symbols))
+        .execution_options(synchronize_session=False)
+    )
 
-            current_price = Decimal(stock["current_price"])
-            avg_multiplier = Decimal(buy_multipliers[stock_index])
-            quantity = Decimal(quantity_templates[stock_index])
-
-            db.add(
-                models.StockInstrument(
-                    user_id=user_id_str,
-                    symbol=stock["symbol"],
-                    name=stock["name"],
-                    quantity=quantity,
-                    average_buy_price=(current_price * avg_multiplier),
-                    current_price=current_price,
-                    currency=stock["currency"],
+    seed = values(
+        column("slot", Integer),
+        column("symbol", String),
+        column("name", String),
+        column("quantity", Numeric(18, 6)),
+        column("average_buy_price", Numeric(18, 6)),
+        column("current_price", Numeric(18, 6)),
+        column("currency", String),
+        name="seed",
+    ).data(_stock_seed_rows())
+    # Ranking by creation time keeps existing users in their slot as new users
+    # are added, so re-runs never hand an existing user a second rotation.
+    ranked_users = select(
+        cast(models.User.user_id, String).label("user_id"),
+        (
+            (
+                func.row_number().over(
+                    order_by=(models.User.created_at, models.User.user_id)
                 )
+                - 1
             )
-
+            % len(MARKET_DUMMY_STOCKS)
+        ).label("slot"),
+    ).subquery("ranked_users")
+
+    columns = [
+        "id",
+        "user_id",
+        "symbol",
+        "name",
+        "quantity",
+        "average_buy_price",
+        "current_price",
+        "currency",
+    ]
+    statement = (
+        pg_insert(holding)
+        .from_select(
+            columns,
+            select(
+                func.gen_random_uuid(),
+                ranked_users.c.user_id,
+                seed.c.symbol,
+                seed.c.name,
+                seed.c.quantity,
+                seed.c.average_buy_price,
+                seed.c.current_price,
+                seed.c.currency,
+            ).join_from(ranked_users, seed, ranked_users.c.slot == seed.c.slot),
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "symbol"])
+    )
+    inserted = db.execute(statement).rowcount
     db.commit()
+    return inserted
@@ -0,0 +1,172 @@
+"""Core read queries that return projected columns as row tuples.
+
+Read endpoints only copy a handful of columns into their responses, so these
+selects skip the ORM entity machinery (identity map, change tracking, unused
+columns such as mcc or merchant_logo_url). Each returned Row is a named tuple
+that supports attribute access, so the response builders accept it in place
+of a model instance.
+"""
+
+from typing import Optional
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from services.common import (
+    decode_transaction_cursor,
+    encode_transaction_cursor,
+    get_today_utc_end,
+)
+
+# Every column a transaction response needs; all of them are carried by
+# ix_transactions_account_id_date, so history reads can be index-only.
+TRANSACTION_COLUMNS = (
+    models.Transaction.transaction_id,
+    models.Transaction.account_id,
+    models.Transaction.date,
+    models.Transaction.amount,
+    models.Transaction.currency,
+    models.Transaction.type,
+    models.Transaction.status,
+    models.Transaction.description,
+    models.Transaction.merchant,
+    models.Transaction.category,
+)
+
+# account_number_encrypted is only read when no stored mask exists yet.
+ACCOUNT_COLUMNS = (
+    models.Account.account_id,
+    models.Account.user_id,
+    models.Account.bank_name,
+    models.Account.account_number_masked,
+    models.Account.account_number_encrypted,
+    models.Account.account_type,
+    models.Account.balance,
+)
+
+STOCK_INSTRUMENT_COLUMNS = (
+    models.StockInstrument.id,
+    models.StockInstrument.user_id,
+    models.StockInstrument.symbol,
+    models.StockInstrument.name,
+    models.StockInstrument.quantity,
+    models.StockInstrument.average_buy_price,
+    models.StockInstrument.current_price,
+    models.StockInstrument.currency,
+    models.StockInstrument.updated_at,
+    models.StockInstrument.created_at,
+)
+
+
+def select_transaction_rows():
+    return select(*TRANSACTION_COLUMNS).where(
+        models.Transaction.date <= get_today_utc_end()
+    )
+
+
+def select_account_history_rows(account_id):
+    return (
+        select_transaction_rows()
+        .where(models.Transaction.account_id == account_id)
+        .order_by(
+            models.Transaction.date.desc(), models.Transaction.transaction_id.desc()
+        )
+    )
+
+
+def owned_by(user_id):
+    """The `owned` column of an ownership-scoped read.
+
+    Scoped reads select this flag next to the requested columns instead of
+    filtering on it, so one result tells "no such row" (404) apart from
+    "someone else's row" (403) without a second query.
+    """
+    return (models.Account.user_id == user_id).label("owned")
+
+
+async def get_owned_account_row(db: AsyncSession, account_id, user_id):
+    result = await db.execute(
+        select(*ACCOUNT_COLUMNS, owned_by(user_id)).where(
+            models.Account.account_id == account_id
+        )
+    )
+    return result.first()
+
+
+async def get_owned_transaction_row(db: AsyncSession, transaction_id, user_id):
+    result = await db.execute(
+        select_transaction_rows()
+        .add_columns(owned_by(user_id))
+        .join(
+            models.Account,
+            models.Account.account_id == models.Transaction.account_id,
+        )
+        .where(models.Transaction.transaction_id == transaction_id)
+    )
+    return result.first()
+
+
+async def fetch_owned_transaction_page(
+    db: AsyncSession, account_id, user_id, cursor: Optional[str], limit: int
+):
+    """Return (account, transactions, next_cursor) for one page of history.
+
+    The account row, its ownership flag and the page come back from a single
+    statement; the page is only joined in when the account is owned. account
+    is None when the account does not exist.
+
+    Keyset pagination on (date, transaction_id): each page is a bounded range
+    scan of ix_transactions_account_id_date, however deep the cursor is.
+    """
+    page = select_account_history_rows(account_id).limit(limit + 1)
+    if cursor:
+        after_date, after_id = decode_transaction_cursor(cursor)
+        # The plain date bound is what the index range scan uses; the OR breaks
+        # ties between transactions sharing a timestamp.
+        page = page.where(
+            models.Transaction.date <= after_date,
+            or_(
+                models.Transaction.date < after_date,
+                models.Transaction.transaction_id < after_id,
+            ),
+        )
+    page = page.subquery("page")
+
+    # The page's account_id is left out: it always equals the account's, which
+    # the rows already carry under that name.
+    page_columns = [column for column in page.c if column.key != "account_id"]
+    result = await db.execute(
+        select(*ACCOUNT_COLUMNS, owned_by(user_id), *page_columns)
+        .select_from(
+            models.Account.__table__.outerjoin(page, models.Account.user_id == user_id)
+        )
+        .where(models.Account.account_id == account_id)
+        .order_by(page.c.date.desc(), page.c.transaction_id.desc())
+    )
+    rows = result.all()
+    if not rows:
+        return None, [], None
+
+    transactions = [row for row in rows if row.transaction_id is not None]
+    next_cursor = None
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        next_cursor = encode_transaction_cursor(transactions[-1])
+    return rows[0], transactions, next_cursor
+
+
+async def list_account_rows(db: AsyncSession, user_id):
+    result = await db.execute(
+        select(*ACCOUNT_COLUMNS).where(models.Account.user_id == user_id)
+    )
+    return result.all()
+
+
+async def list_stock_instrument_rows(db: AsyncSession, user_id: str):
+    result = await db.execute(
+        select(*STOCK_INSTRUMENT_COLUMNS)
+        .where(models.StockInstrument.user_id == user_id)
+        .order_by(models.StockInstrument.symbol.asc())
+    )
+    return result.all()
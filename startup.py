@@ -0,0 +1,102 @@
+import asyncio
+import time
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import ProgrammingError
+
+import models
+from config import STARTUP_LEADER_WAIT_SECONDS, STARTUP_LOCK_POLL_SECONDS
+from database import get_engine
+
+# Arbitrary application-wide key for pg_try_advisory_lock ("KOSH").
+STARTUP_ADVISORY_LOCK_ID = 0x4B4F5348
+STARTUP_COMPLETE_FLAG = "startup_complete"
+
+
+def _database_now(conn):
+    return conn.execute(select(func.now())).scalar_one()
+
+
+def _startup_completed_since(conn, since) -> bool:
+    flag = models.SystemFlag
+    try:
+        row = conn.execute(
+            select(flag.enabled).where(
+                flag.name == STARTUP_COMPLETE_FLAG, flag.updated_at >= since
+            )
+        ).first()
+    except ProgrammingError:
+        # system_flags does not exist yet on a fresh database.
+        return False
+    return bool(row and row.enabled)
+
+
+def _mark_startup_complete(conn) -> None:
+    table = models.SystemFlag.__table__
+    statement = pg_insert(table).values(
+        name=STARTUP_COMPLETE_FLAG, enabled=True, updated_at=func.now()
+    )
+    conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={"enabled": True, "updated_at": func.now()},
+        )
+    )
+
+
+def _run_if_leader(tasks, started_at) -> Optional[bool]:
+    """Return None if the lock is busy, else whether this worker ran the tasks."""
+    # The advisory lock is session scoped, so it is held on one AUTOCOMMIT
+    # connection for the whole run and released even if a task fails.
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if not conn.execute(
+            select(func.pg_try_advisory_lock(STARTUP_ADVISORY_LOCK_ID))
+        ).scalar_one():
+            return None
+        try:
+            if _startup_completed_since(conn, started_at):
+                print("Startup tasks already completed by another worker.")
+                return False
+            tasks()
+            _mark_startup_complete(conn)
+        finally:
+            conn.execute(select(func.pg_advisory_unlock(STARTUP_ADVISORY_LOCK_ID)))
+    return True
+
+
+def _boot_timestamp():
+    with get_engine().connect() as conn:
+        return _database_now(conn)
+
+
+async def run_startup_tasks_once(tasks) -> bool:
+    """Run blocking startup tasks in exactly one worker of a deployment.
+
+    The first worker to take the advisory lock runs the tasks and stamps the
+    startup_complete flag. The others poll the lock without holding a thread
+    or connection, and once they get it they return as soon as they see a
+    stamp newer than their own boot. If the leader died, the next worker runs
+    the tasks instead. Returns True in the worker that ran the tasks, so
+    other once-per-deployment work can follow the same leader.
+    """
+    if get_engine().dialect.name != "postgresql":
+        await asyncio.to_thread(tasks)
+        return True
+
+    started_at = await asyncio.to_thread(_boot_timestamp)
+    deadline = time.monotonic() + STARTUP_LEADER_WAIT_SECONDS
+    waiting = False
+    while True:
+        leader = await asyncio.to_thread(_run_if_leader, tasks, started_at)
+        if leader is not None:
+            return leader
+        if time.monotonic() >= deadline:
+            raise RuntimeError(
+                f"Startup leader did not finish within {STARTUP_LEADER_WAIT_SECONDS}s"
+            )
+        if not waiting:
+            print("Another worker is running startup tasks; waiting...")
+            waiting = True
+        await asyncio.sleep(STARTUP_LOCK_POLL_SECONDS)